@@ -1,2 +1,7 @@
+from .cache import ResponseCache
 from .decode import decode
 from .encode import PreparedBatchExecute
+from .hedge import HedgePolicy, send_hedged, send_hedged_async
+from .models import ResultModels
+from .ratelimit import RateLimiter
+from .scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE, RpcScheduler
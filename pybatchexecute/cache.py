@@ -0,0 +1,322 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+__all__ = ["ResponseCache"]
+
+
+class ResponseCache(object):
+    """A persistent cache of RPC responses, shared across processes
+
+    Responses are stored in a SQLite database (in WAL mode, so many processes
+    on the same machine can read while one writes), keyed by
+    ``host``, ``app``, ``user``, ``rpcid`` and the canonical JSON of the RPC ``args``.
+
+    Payloads are stored as raw (JSON) strings, as found in a response envelope
+    (see ``decode(..., raw_data=True)``), so they are only decoded when (and if)
+    they are used (see ``get_data()``). Size-bounded compaction needs SQLite 3.25+.
+
+    Example:
+
+    ```
+    cache = ResponseCache("responses.db", ttl=3600, max_bytes=100 * 1024 * 1024)
+
+    payload = cache.get(host, app, rpcid, args)
+    if payload is None:
+        ...
+        for index, rpcid, payload in decode(r.text, raw_data=True):
+            cache.put(host, app, rpcid, args, payload)
+    ```
+
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float = None,
+        max_bytes: int = None,
+        compact_every: int = 1000,
+        timeout: float = 30.0,
+    ) -> None:
+        """Open (or create) a response cache
+
+        Args:
+            path (str): The path of the SQLite database file
+            ttl (float): The default time-to-live (in seconds) of cached payloads
+                (default: ``None``, never expire)
+            max_bytes (int): The maximum total size (in UTF-8 bytes) of cached payloads,
+                enforced by ``compact()`` by evicting the oldest payloads first
+                (default: ``None``, unbounded)
+            compact_every (int): Run ``compact()`` every ``compact_every`` calls to ``put()``
+                made by this instance (default: ``1000``, ``0`` to disable)
+            timeout (float): The number of seconds to wait for another process
+                holding a lock on the database (default: ``30.0``)
+
+        Raises:
+            ValueError: If ``ttl`` or ``max_bytes`` is not positive
+
+        """
+        if ttl is not None and ttl <= 0:
+            raise ValueError("'ttl' must be positive")
+
+        if max_bytes is not None and max_bytes <= 0:
+            raise ValueError("'max_bytes' must be positive")
+
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.compact_every = compact_every
+        self.timeout = timeout
+
+        self._local = threading.local()
+        self._puts = 0
+
+        with self._transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    expires REAL
+                )
+                """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_created ON responses (created)"
+            )
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """Get the connection of the current thread (and process)"""
+        conn = getattr(self._local, "conn", None)
+
+        # Connections must not be shared across a fork()
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+
+        return conn
+
+    def _transaction(self):
+        """Get a context manager for a write transaction"""
+        return _Transaction(self._conn)
+
+    @staticmethod
+    def key(host: str, app: str, rpcid: str, args: list, user: str = None) -> str:
+        """Build the cache key of a RPC
+
+        Args:
+            host (str): The host the RPC is sent to
+            app (str): The app the RPC is sent to
+            rpcid (str): The ``rpcid`` of the RPC
+            args (list): The arguments of the RPC
+            user (str): The user the RPC is sent as, if any (default: ``None``)
+
+        Returns:
+            str: The key (a SHA-256 hex digest of the canonical JSON of the RPC)
+
+        """
+        # Without a user, keys are the same as before 'user' was part of them
+        parts = (
+            [host, app, rpcid, args] if user is None else [host, app, user, rpcid, args]
+        )
+        canonical = json.dumps(
+            parts,
+            sort_keys=True,
+            separators=(",", ":"),
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(
+        self, host: str, app: str, rpcid: str, args: list, user: str = None
+    ) -> Optional[str]:
+        """Get the raw payload of a cached RPC response
+
+        Args:
+            host (str): The host the RPC is sent to
+            app (str): The app the RPC is sent to
+            rpcid (str): The ``rpcid`` of the RPC
+            args (list): The arguments of the RPC
+            user (str): The user the RPC is sent as, if any (default: ``None``)
+
+        Returns:
+            str: The raw (JSON) payload, or ``None`` if not cached (or expired)
+
+        """
+        row = self._conn.execute(
+            "SELECT payload FROM responses WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (self.key(host, app, rpcid, args, user), time.time()),
+        ).fetchone()
+
+        return row[0] if row else None
+
+    def get_data(
+        self, host: str, app: str, rpcid: str, args: list, user: str = None
+    ) -> Optional[Any]:
+        """Get the decoded payload of a cached RPC response
+
+        Args:
+            host (str): The host the RPC is sent to
+            app (str): The app the RPC is sent to
+            rpcid (str): The ``rpcid`` of the RPC
+            args (list): The arguments of the RPC
+            user (str): The user the RPC is sent as, if any (default: ``None``)
+
+        Returns:
+            list: The decoded JSON payload, or ``None`` if not cached (or expired)
+
+        """
+        payload = self.get(host, app, rpcid, args, user)
+        return json.loads(payload) if payload is not None else None
+
+    def put(
+        self,
+        host: str,
+        app: str,
+        rpcid: str,
+        args: list,
+        payload: Any,
+        ttl: float = None,
+        user: str = None,
+    ) -> None:
+        """Cache the payload of a RPC response
+
+        Args:
+            host (str): The host the RPC is sent to
+            app (str): The app the RPC is sent to
+            rpcid (str): The ``rpcid`` of the RPC
+            args (list): The arguments of the RPC
+            payload (str): The raw (JSON) payload. Any other type is
+                stored as its JSON serialization
+            ttl (float): The time-to-live (in seconds) of the payload
+                (default: ``None``, use the cache ``ttl``)
+            user (str): The user the RPC is sent as, if any (default: ``None``)
+
+        Raises:
+            ValueError: If ``ttl`` is not positive
+
+        """
+        if ttl is not None and ttl <= 0:
+            raise ValueError("'ttl' must be positive")
+
+        if not isinstance(payload, str):
+            payload = json.dumps(payload, separators=(",", ":"))
+
+        ttl = ttl if ttl is not None else self.ttl
+        now = time.time()
+
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (
+                    self.key(host, app, rpcid, args, user),
+                    payload,
+                    len(payload.encode("utf-8")),
+                    now,
+                    now + ttl if ttl is not None else None,
+                ),
+            )
+
+        self._puts += 1
+        if self.compact_every and self._puts % self.compact_every == 0:
+            self.compact()
+
+    def delete(
+        self, host: str, app: str, rpcid: str, args: list, user: str = None
+    ) -> None:
+        """Remove a RPC response from the cache
+
+        Args:
+            host (str): The host the RPC is sent to
+            app (str): The app the RPC is sent to
+            rpcid (str): The ``rpcid`` of the RPC
+            args (list): The arguments of the RPC
+            user (str): The user the RPC is sent as, if any (default: ``None``)
+
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                "DELETE FROM responses WHERE key = ?",
+                (self.key(host, app, rpcid, args, user),),
+            )
+
+    def compact(self) -> int:
+        """Remove expired payloads, then the oldest ones until under ``max_bytes``
+
+        Returns:
+            int: The number of payloads removed
+
+        """
+        with self._transaction() as conn:
+            removed = conn.execute(
+                "DELETE FROM responses WHERE expires IS NOT NULL AND expires <= ?",
+                (time.time(),),
+            ).rowcount
+
+            if self.max_bytes is not None:
+                # Keep the newest payloads that fit in 'max_bytes'
+                # (the cutoff is computed by SQLite, to hold the write lock briefly)
+                removed += conn.execute(
+                    """
+                    DELETE FROM responses WHERE rowid IN (
+                        SELECT rowid FROM (
+                            SELECT rowid, SUM(size) OVER (
+                                ORDER BY created DESC, rowid DESC
+                            ) AS running
+                            FROM responses
+                        )
+                        WHERE running > ?
+                    )
+                    """,
+                    (self.max_bytes,),
+                ).rowcount
+
+        return removed
+
+    def clear(self) -> None:
+        """Remove all payloads from the cache"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM responses")
+
+    def __len__(self) -> int:
+        """Get the number of cached payloads (including expired ones not yet compacted)"""
+        return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self) -> None:
+        """Close the connection of the current thread"""
+        conn = getattr(self._local, "conn", None)
+
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+
+        self._local.conn = None
+
+    def __enter__(self) -> "ResponseCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class _Transaction(object):
+    """A write transaction (``BEGIN IMMEDIATE``) on an autocommit connection"""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, *exc) -> None:
+        self.conn.execute("COMMIT" if exc_type is None else "ROLLBACK")
@@ -0,0 +1,335 @@
+import argparse
+import collections
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+from .decode import BatchExecuteDecodeException, decode
+
+__all__ = ["main"]
+
+# Number of responses decoded ahead of the output, per worker process
+WINDOW_PER_JOB = 2
+
+# Anti-XSSI prefix of responses
+PREFIX = ")]}'"
+
+
+def _detect_rt(raw: str) -> Optional[str]:
+    """Detect the ``rt`` (response type) a raw response was made with
+
+    After the ``)]}'`` prefix, responses made with an ``rt`` of ``c`` start with the
+    length of their first envelope, and ones made with no ``rt`` start with a JSON array.
+
+    Args:
+        raw (str): The raw response text from a ``batchexecute`` RPC
+
+    Returns:
+        str: ``"c"`` or ``None``
+
+    Raises:
+        BatchExecuteDecodeException: If the format could not be detected
+
+    """
+    start = raw.find(PREFIX)
+    start = start + len(PREFIX) if start >= 0 else 0
+
+    for char in raw[start : start + 1024]:
+        if char.isspace():
+            continue
+        elif char.isdigit():
+            return "c"
+        elif char == "[":
+            return None
+        else:
+            break
+
+    raise BatchExecuteDecodeException("Could not detect response format of 'raw'.")
+
+
+def _read(path: str) -> Tuple[str, int]:
+    """Read a file as text
+
+    Args:
+        path (str): The path of the file
+
+    Returns:
+        tuple: The text of the file and its size (in bytes)
+
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    return data.decode("utf-8"), len(data)
+
+
+def _error(e: Exception) -> str:
+    """Format the error of a response that couldn't be decoded"""
+    if isinstance(e, BatchExecuteDecodeException):
+        return str(e)
+    return f"{type(e).__name__}: {e}"
+
+
+def _decode_text(
+    raw: str,
+    rt: str,
+    strict: bool,
+    expected_rpcids: List[str],
+    rpcids: List[str],
+) -> Tuple[str, int]:
+    """Decode a raw response to NDJSON records
+
+    Args:
+        raw (str): The raw response text from a ``batchexecute`` RPC
+        rt (str): The ``rt`` of the response, ``"auto"`` to detect it
+        strict (bool): See ``decode()``, only checks for empty data
+            if ``expected_rpcids`` is empty
+        expected_rpcids (list): See ``decode()``
+        rpcids (list): The ``rpcid``s to output (all if empty)
+
+    Returns:
+        tuple: The NDJSON records (one per line) and their count
+
+    """
+    if rt == "auto":
+        rt = _detect_rt(raw)
+
+    # decode() would compare the rpcids to no expected ones (and always fail)
+    decoded = decode(
+        raw,
+        rt=rt,
+        strict=strict and bool(expected_rpcids),
+        expected_rpcids=expected_rpcids,
+    )
+
+    records = []
+    for index, rpcid, data in decoded:
+        if strict and not expected_rpcids and data == []:
+            raise BatchExecuteDecodeException(
+                f"Envelope {index} ({rpcid}): data is empty (strict)."
+            )
+
+        if rpcids and rpcid not in rpcids:
+            continue
+
+        records.append(
+            json.dumps(
+                {"index": index, "rpcid": rpcid, "data": data},
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+        )
+
+    return "".join(record + "\n" for record in records), len(records)
+
+
+def _decode_file(task: tuple) -> Tuple[str, str, int, int, Optional[str]]:
+    """Decode a file to NDJSON records (run in a worker process)
+
+    Args:
+        task (tuple): The path of the file, followed by the arguments of ``_decode_text()``
+
+    Returns:
+        tuple: The path of the file, the NDJSON records, their count,
+        the size of the file (in bytes) and the error (``None`` if there was none)
+
+    """
+    path, *args = task
+
+    # Any error is reported for this file only, so that one bad file
+    # doesn't stop the decoding of all others
+    try:
+        raw, size = _read(path)
+        lines, count = _decode_text(raw, *args)
+        return path, lines, count, size, None
+    except Exception as e:
+        return path, "", 0, 0, _error(e)
+
+
+def _walk(paths: List[str]) -> Iterator[str]:
+    """Expand directories (recursively) in ``paths``, in sorted order"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def _parser() -> argparse.ArgumentParser:
+    """Build the command-line argument parser"""
+    parser = argparse.ArgumentParser(
+        prog="python -m pybatchexecute",
+        description="Tools for Google's batchexecute batch RPC system",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    d = commands.add_parser(
+        "decode",
+        help="Decode raw responses to NDJSON",
+        description="Decode raw batchexecute responses, one per file, "
+        + 'to NDJSON records of the form {"index", "rpcid", "data"}.',
+    )
+    d.add_argument(
+        "paths",
+        nargs="*",
+        metavar="PATH",
+        help="Files or directories (recursively) to decode, '-' for stdin (default: stdin)",
+    )
+    d.add_argument(
+        "--rt",
+        choices=["auto", "c", "none"],
+        default="auto",
+        help="The 'rt' the responses were made with (default: auto-detect per response)",
+    )
+    d.add_argument(
+        "--rpcid",
+        action="append",
+        default=[],
+        dest="rpcids",
+        help="Only output records of this rpcid (can be repeated)",
+    )
+    d.add_argument(
+        "--strict",
+        action="store_true",
+        help="Fail on empty data, and on rpcids different from --expected-rpcid (if any)",
+    )
+    d.add_argument(
+        "--expected-rpcid",
+        action="append",
+        default=[],
+        dest="expected_rpcids",
+        help="An expected rpcid of each response, with --strict (can be repeated)",
+    )
+    d.add_argument(
+        "--fail-fast",
+        action="store_true",
+        help="Stop at the first response that can't be decoded",
+    )
+    d.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="The number of worker processes (default: number of CPUs)",
+    )
+    d.add_argument(
+        "-q",
+        "--quiet",
+        action="store_true",
+        help="Don't report throughput when done",
+    )
+
+    return parser
+
+
+def _decode_command(args: argparse.Namespace) -> int:
+    """Run the ``decode`` command
+
+    Returns:
+        int: The exit status
+
+    """
+    rt = None if args.rt == "none" else args.rt
+    decode_args = (rt, args.strict, args.expected_rpcids, args.rpcids)
+
+    paths = list(_walk(args.paths or ["-"]))
+
+    started = time.perf_counter()
+    total_responses = 0
+    total_records = 0
+    total_bytes = 0
+    errors = 0
+
+    def _results() -> Iterator[Tuple[str, str, int, int, Optional[str]]]:
+        files = iter([path for path in paths if path != "-"])
+
+        if args.jobs > 1 and len(paths) > 1:
+            executor = ProcessPoolExecutor(max_workers=args.jobs)
+        else:
+            executor = None
+
+        # Responses decoding (or decoded) ahead of the output. Bounded, so that
+        # results don't pile up in memory while they are written in order
+        window = collections.deque()
+        window_size = WINDOW_PER_JOB * args.jobs
+
+        def _fill() -> None:
+            while executor is not None and len(window) < window_size:
+                path = next(files, None)
+                if path is None:
+                    return
+                window.append(executor.submit(_decode_file, (path,) + decode_args))
+
+        try:
+            for path in paths:
+                if path == "-":
+                    raw = sys.stdin.read()
+                    try:
+                        lines, count = _decode_text(raw, *decode_args)
+                        yield path, lines, count, len(raw.encode("utf-8")), None
+                    except Exception as e:
+                        yield path, "", 0, 0, _error(e)
+                elif executor is None:
+                    yield _decode_file((next(files),) + decode_args)
+                else:
+                    # Results are in the same order as 'paths'
+                    _fill()
+                    result = window.popleft().result()
+                    _fill()
+                    yield result
+        finally:
+            if executor is not None:
+                for future in window:
+                    future.cancel()
+                executor.shutdown()
+
+    for path, lines, count, size, error in _results():
+        if error is not None:
+            errors += 1
+            print(f"{path}: {error}", file=sys.stderr)
+            if args.fail_fast:
+                break
+            continue
+
+        sys.stdout.write(lines)
+        total_responses += 1
+        total_records += count
+        total_bytes += size
+
+    sys.stdout.flush()
+
+    if not args.quiet:
+        elapsed = time.perf_counter() - started
+        mb = total_bytes / (1024 * 1024)
+        print(
+            f"Decoded {total_records} records from {total_responses} responses "
+            + f"({mb:.1f} MiB) in {elapsed:.2f}s "
+            + f"({mb / elapsed if elapsed > 0 else 0:.1f} MiB/s), {errors} failed",
+            file=sys.stderr,
+        )
+
+    return 1 if errors else 0
+
+
+def main(argv: List[str] = None) -> int:
+    """Run the command-line interface
+
+    Args:
+        argv (list): The command-line arguments (default: ``None``, ``sys.argv[1:]``)
+
+    Returns:
+        int: The exit status
+
+    """
+    args = _parser().parse_args(argv)
+
+    if args.command == "decode":
+        return _decode_command(args)
+
+    return 2
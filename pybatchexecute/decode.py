@@ -1,6 +1,8 @@
 import json
 import re
-from typing import List, Tuple
+from typing import Any, Iterator, List, Optional, Tuple
+
+from .models import ResultModels
 
 __all__ = ["decode"]
 
@@ -9,9 +11,182 @@ class BatchExecuteDecodeException(Exception):
     pass
 
 
+# Anti-XSSI prefix of responses
+_PREFIX = ")]}'"
+
+# JSON whitespace (as skipped by the json module)
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+# Length line before each envelope of 'rt=c' responses
+_LENGTH = re.compile(r"\d+\n")
+
+_decoder = json.JSONDecoder()
+
+
+def _skip_prefix(raw: str, required: bool = True) -> int:
+    """Get the position in ``raw`` right after the ``)]}'`` prefix (and whitespace)
+
+    Raises:
+        json.decoder.JSONDecodeError: If ``raw`` doesn't start with the prefix
+            (if ``required`` is ``True``, otherwise its position is ``0``)
+
+    """
+    pos = _WHITESPACE.match(raw).end()
+
+    if raw.startswith(_PREFIX, pos):
+        pos += len(_PREFIX)
+    elif required:
+        raise json.decoder.JSONDecodeError(f"Expecting '{_PREFIX}' prefix", raw, pos)
+    else:
+        pos = 0
+
+    return _WHITESPACE.match(raw, pos).end()
+
+
+def _iter_array(raw: str, pos: int) -> Iterator[Any]:
+    """Iterate over the elements of the JSON array starting at ``pos`` in ``raw``
+
+    Elements are decoded one at a time (with ``raw_decode``, i.e. in place in ``raw``)
+    so that the array is never fully materialised.
+
+    Raises:
+        json.decoder.JSONDecodeError: If the array is not valid JSON
+            or is followed by anything other than whitespace
+
+    """
+    pos = _WHITESPACE.match(raw, pos).end()
+
+    if raw[pos : pos + 1] != "[":
+        raise json.decoder.JSONDecodeError("Expecting '['", raw, pos)
+
+    pos = _WHITESPACE.match(raw, pos + 1).end()
+
+    if raw[pos : pos + 1] != "]":
+        while True:
+            value, pos = _decoder.raw_decode(raw, pos)
+            yield value
+            del value
+
+            pos = _WHITESPACE.match(raw, pos).end()
+            char = raw[pos : pos + 1]
+
+            if char == "]":
+                break
+            elif char != ",":
+                raise json.decoder.JSONDecodeError("Expecting ',' delimiter", raw, pos)
+
+            pos = _WHITESPACE.match(raw, pos + 1).end()
+
+    # Same as json.loads(): nothing but whitespace after the array
+    pos = _WHITESPACE.match(raw, pos + 1).end()
+    if pos != len(raw):
+        raise json.decoder.JSONDecodeError("Extra data", raw, pos)
+
+
+def _malformed(envelope: Any) -> BatchExecuteDecodeException:
+    """Build the exception for a malformed envelope"""
+    return BatchExecuteDecodeException(
+        f"Malformed envelope: {json.dumps(envelope)[:100]}"
+    )
+
+
+def _decode_envelope(
+    envelope: list,
+    strict: bool = False,
+    models: ResultModels = None,
+    raw_data: bool = False,
+) -> Optional[Tuple[int, str, Any]]:
+    """Decode a single envelope (of the form ``["wrb.fr", <rpc id>, <rpc response>, ...]``)
+
+    Its rpc response (a JSON string) is decoded right away, so that the
+    (unescaped) string is released as soon as the envelope is decoded.
+
+    Args:
+        envelope (list): The envelope
+        strict (bool): Whether to raise an exception if the response data is empty
+        models (ResultModels): Result models to extract response data into (default: ``None``)
+        raw_data (bool): Whether to return the response data as its raw JSON string,
+            without decoding it (default: ``False``)
+
+    Returns:
+        tuple: The index, ``rpcid`` and data of the response,
+        or ``None`` if the envelope is not a RPC response
+
+    Raises:
+        BatchExecuteDecodeException: If the envelope is malformed (e.g. truncated)
+        BatchExecuteDecodeException: If the response data is missing
+        BatchExecuteDecodeException: If the response data is not a valid JSON string
+        BatchExecuteDecodeException: If the response data is empty (if ``strict`` is ``True``)
+
+    """
+    if not isinstance(envelope, list) or not envelope:
+        raise _malformed(envelope)
+
+    # Ignore envelopes that don't have 'wrb.fr' at [0]
+    # (they're not rpc reponses but analytics etc.)
+    if envelope[0] != "wrb.fr":
+        return None
+
+    if len(envelope) < 7:
+        raise _malformed(envelope)
+
+    # index (at [6], string)
+    # index is 1-based
+    # index is "generic" if the response contains a single envelope
+    if envelope[6] == "generic":
+        index = 1
+    else:
+        try:
+            index = int(envelope[6])
+        except (TypeError, ValueError):
+            raise _malformed(envelope)
+
+    # rpcid (at [1])
+    # rpcid's response (at [2], a json string)
+    rpcid = envelope[1]
+
+    if not isinstance(envelope[2], str):
+        raise BatchExecuteDecodeException(
+            f"Envelope {index} ({rpcid}): data is missing."
+        )
+
+    if raw_data:
+        data = envelope[2]
+
+        if strict and data.strip() == "[]":
+            raise BatchExecuteDecodeException(
+                f"Envelope {index} ({rpcid}): data is empty (strict)."
+            )
+
+        return (index, rpcid, data)
+
+    try:
+        data = json.loads(envelope[2])
+    except json.decoder.JSONDecodeError as e:
+        raise BatchExecuteDecodeException(
+            f"Envelope {index} ({rpcid}): data is not a valid JSON string. "
+            + "JSON decode error was: "
+            + str(e)
+        )
+
+    # Release the response string
+    envelope[2] = None
+
+    if strict and data == []:
+        raise BatchExecuteDecodeException(
+            f"Envelope {index} ({rpcid}): data is empty (strict)."
+        )
+
+    # Extract into the rpcid's model (if any)
+    if models is not None and rpcid in models:
+        data = models.extract(rpcid, data)
+
+    return (index, rpcid, data)
+
+
 def _decode_rt_compressed(
-    raw: str, strict: bool = False
-) -> List[Tuple[int, str, list]]:
+    raw: str, strict: bool = False, models: ResultModels = None, raw_data: bool = False
+) -> List[Tuple[int, str, Any]]:
     """Decode a raw response from a ``batchexecute`` RPC
     made with an ``rt`` (response type) of ``c`` (compressed)
 
@@ -36,80 +211,74 @@ def _decode_rt_compressed(
 
     Args:
         raw (str): The raw response from a ``batchexecute`` RPC
+        strict (bool): Whether to raise an exception if any response data is empty
+        models (ResultModels): Result models to extract response data into (default: ``None``)
+        raw_data (bool): Whether to return response data as raw JSON strings (default: ``False``)
 
     Returns:
         list: A list of tuples, each tuple containing:
             index (int): The index of the response
             rpcid (str): The ``rpcid`` of the response
             data (list): The decoded JSON data of the response
+                (or its model instance, if ``rpcid`` has one in ``models``)
 
     Raises:
+        BatchExecuteDecodeException: If an envelope is not valid JSON (e.g. truncated)
+            or is followed by anything other than an envelope length
+        BatchExecuteDecodeException: If any envelope is malformed
         BatchExecuteDecodeException: If any response data is not a valid JSON string
         BatchExecuteDecodeException: If any response data is empty (if ``strict`` is ``True``)
 
     """
 
-    # Regex pattern to extract raw data responses (envelopes)
-    p = re.compile(
-        pattern=r"""
-            (\d+\n)            # <number><\n>
-            (?P<envelope>.+?)  # 'envelope': anything incl. <\n> (re.DOTALL)
-            (?=\d+\n|$)        # until <number><\n> or <end>
-        """,
-        flags=re.DOTALL | re.VERBOSE,
-    )
-
     decoded = []
+    pos = _skip_prefix(raw, required=False)
 
-    for item in p.finditer(raw):
-        # An 'envelope' group is a json string
-        # e.g.: '[["wrb.fr","jQ1olc","[\"abc\"]\n",null,null,null,"generic"]]'
-        #          ^^^^^^^^  ^^^^^^   ^^^^^^^^^^^^                 ^^^^^^^^^
-        #          [0][0]    [0][1]   [0][2]                       [0][6]
-        #          constant  rpc id   rpc response                 envelope index or
-        #          (str)     (str)    (json str)                   "generic" if single envelope
-        #                                                          (str)
-        envelope_raw = item.group("envelope")
-        envelope = json.loads(envelope_raw)
-
-        # Ignore envelopes that don't have 'wrb.fr' at [0][0]
-        # (they're not rpc reponses but analytics etc.)
-        if envelope[0][0] != "wrb.fr":
-            continue
-
-        # index (at [0][6], string)
-        # index is 1-based
-        # index is "generic" if the response contains a single envelope
-        if envelope[0][6] == "generic":
-            index = 1
-        else:
-            index = int(envelope[0][6])
-
-        # rpcid (at [0][1])
-        # rpcid's response (at [0][2], a json string)
-        rpcid = envelope[0][1]
+    while True:
+        pos = _WHITESPACE.match(raw, pos).end()
+        if pos == len(raw):
+            break
 
         try:
-            data = json.loads(envelope[0][2])
+            # <number><\n> (the envelope length, which isn't used)
+            item = _LENGTH.match(raw, pos)
+            if item is None:
+                raise json.decoder.JSONDecodeError(
+                    "Expecting envelope length", raw, pos
+                )
+
+            # An 'envelope' is decoded in place, up to its end
+            # e.g.: '[["wrb.fr","jQ1olc","[\"abc\"]\n",null,null,null,"generic"]]'
+            #          ^^^^^^^^  ^^^^^^   ^^^^^^^^^^^^                 ^^^^^^^^^
+            #          [0][0]    [0][1]   [0][2]                       [0][6]
+            #          constant  rpc id   rpc response                 envelope index or
+            #          (str)     (str)    (json str)                   "generic" if single envelope
+            #                                                          (str)
+            envelope, pos = _decoder.raw_decode(raw, item.end())
         except json.decoder.JSONDecodeError as e:
             raise BatchExecuteDecodeException(
-                f"Envelope {index} ({rpcid}): data is not a valid JSON string. "
+                "Could not decode envelope. Check format of 'raw'. "
                 + "JSON decode error was: "
                 + str(e)
             )
 
-        if strict and data == []:
-            raise BatchExecuteDecodeException(
-                f"Envelope {index} ({rpcid}): data is empty (strict)."
-            )
+        if not isinstance(envelope, list) or not envelope:
+            raise _malformed(envelope)
+
+        response = _decode_envelope(
+            envelope[0], strict=strict, models=models, raw_data=raw_data
+        )
+        del envelope
 
-        # Append as tuple
-        decoded.append((index, rpcid, data))
+        if response is not None:
+            decoded.append(response)
 
     return decoded
 
 
-def _decode_rt_default(raw: str, strict: bool = False) -> List[Tuple[int, str, list]]:
+def _decode_rt_default(
+    raw: str, strict: bool = False, models: ResultModels = None, raw_data: bool = False
+) -> List[Tuple[int, str, Any]]:
     """Decode a raw response from a ``batchexecute`` RPC
     made with no ``rt`` (response type) value
 
@@ -131,67 +300,50 @@ def _decode_rt_default(raw: str, strict: bool = False) -> List[Tuple[int, str, l
 
     Args:
         raw (str): The raw response from a ``batchexecute`` RPC
+        strict (bool): Whether to raise an exception if any response data is empty
+        models (ResultModels): Result models to extract response data into (default: ``None``)
+        raw_data (bool): Whether to return response data as raw JSON strings (default: ``False``)
 
     Returns:
         list: A list of tuples, each tuple containing:
             index (int): The index of the response
             rpcid (str): The ``rpcid`` of the response
             data (list): The decoded JSON data of the response
+                (or its model instance, if ``rpcid`` has one in ``models``)
 
     Raises:
+        json.decoder.JSONDecodeError: If ``raw`` doesn't start with the ``)]}'`` prefix
+        json.decoder.JSONDecodeError: If the array of envelopes is not valid JSON
+            (e.g. truncated) or is followed by anything other than whitespace
+        BatchExecuteDecodeException: If any envelope is malformed
         BatchExecuteDecodeException: If any response data is not a valid JSON string
         BatchExecuteDecodeException: If any response data is empty (if ``strict`` is ``True``)
 
     """
 
-    # Trim the first 2 lines
-    # ")]}'" and an empty line
-    envelopes_raw = "".join(raw.split("\n")[2:])
-
-    # Load all envelopes JSON (list of envelopes)
-    envelopes = json.loads(envelopes_raw)
-
     decoded = []
 
-    for envelope in envelopes:
-        # Ignore envelopes that don't have 'wrb.fr' at [0]
-        # (they're not rpc reponses but analytics etc.)
-        if envelope[0] != "wrb.fr":
-            continue
-
-        # index (at [6], string)
-        # index is 1-based
-        # index is "generic" if the response contains a single envelope
-        if envelope[6] == "generic":
-            index = 1
-        else:
-            index = int(envelope[6])
-
-        # rpcid (at [1])
-        # rpcid's response (at [2], a json string)
-        rpcid = envelope[1]
-
-        try:
-            data = json.loads(envelope[2])
-        except json.decoder.JSONDecodeError as e:
-            raise BatchExecuteDecodeException(
-                f"Envelope {index} ({rpcid}): data is not a valid JSON string. "
-                + "JSON decode error was: "
-                + str(e)
-            )
-
-        if strict and data == []:
-            raise BatchExecuteDecodeException(
-                f"Envelope {index} ({rpcid}): data is empty (strict)."
-            )
+    # Skip ")]}'" and decode envelopes one at a time (list of envelopes)
+    for envelope in _iter_array(raw, _skip_prefix(raw)):
+        response = _decode_envelope(
+            envelope, strict=strict, models=models, raw_data=raw_data
+        )
+        del envelope
 
-        # Append as tuple
-        decoded.append((index, rpcid, data))
+        if response is not None:
+            decoded.append(response)
 
     return decoded
 
 
-def decode(raw: str, rt: str = None, strict: bool = False, expected_rpcids: list = []):
+def decode(
+    raw: str,
+    rt: str = None,
+    strict: bool = False,
+    expected_rpcids: list = [],
+    models: ResultModels = None,
+    raw_data: bool = False,
+):
     """Decode a raw response from a ``batchexecute`` RPC
 
     Args:
@@ -201,15 +353,26 @@ def decode(raw: str, rt: str = None, strict: bool = False, expected_rpcids: list
             or the input ``rpcid``s are different from the output ``rpcid``s (default: ``False``)
         expected_rpcids (list): A list of expected ``rpcid`` values,
             ignored if ``strict`` is ``False`` (default: ``[]``)
+        models (ResultModels): Result models to extract the data of their ``rpcid``
+            into, as each envelope is decoded (default: ``None``)
+        raw_data (bool): Whether to return the data of each envelope as its raw JSON string,
+            without decoding it, e.g. to store it in a ``ResponseCache`` and decode it
+            lazily (default: ``False``)
 
     Returns:
         list: A list of tuples, each tuple containing:
             * ``index`` (int): The index of the response
             * ``rpcid`` (str): The ``rpcid`` of the response
             * ``data`` (list): The JSON data returned by the ``rpcid`` function
+              (or its model instance, if ``rpcid`` has one in ``models``,
+              or its raw JSON string, if ``raw_data`` is ``True``)
 
     Raises:
         ValueError: If ``rt`` is not ``"c"``, ``"b"``, or ``None``
+        ValueError: If both ``models`` and ``raw_data`` are set
+        json.decoder.JSONDecodeError: If the response is not framed as expected
+            (e.g. truncated, missing prefix or trailing data), if ``rt`` is ``None``
+        BatchExecuteDecodeException: If any envelope is malformed
         BatchExecuteDecodeException: If nothing could be decoded
         BatchExecuteDecodeException: If the count of input and output ``rpcid``s is different
             (if ``strict`` is ``True``)
@@ -217,12 +380,19 @@ def decode(raw: str, rt: str = None, strict: bool = False, expected_rpcids: list
             (if ``strict`` is ``True``)
 
     """
+    if models is not None and raw_data:
+        raise ValueError("'models' and 'raw_data' can't be used together")
+
     if rt == "c":
-        decoded = _decode_rt_compressed(raw, strict=strict)
+        decoded = _decode_rt_compressed(
+            raw, strict=strict, models=models, raw_data=raw_data
+        )
     elif rt == "b":
         raise ValueError("Decoding 'rt' as 'b' (ProtoBuf) is not implemented")
     elif rt is None:
-        decoded = _decode_rt_default(raw, strict=strict)
+        decoded = _decode_rt_default(
+            raw, strict=strict, models=models, raw_data=raw_data
+        )
     else:
         raise ValueError("Invalid 'rt' value")
 
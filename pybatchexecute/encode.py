@@ -1,6 +1,8 @@
 import json
 import random
-from typing import List, TypedDict
+from json.encoder import encode_basestring_ascii
+from typing import Iterator, List, TypedDict
+from urllib.parse import quote_plus
 
 __all__ = ["PreparedBatchExecute"]
 
@@ -25,6 +27,9 @@ class PreparedBatchExecute(object):
       * ``data`` _dict_ - The POST data to send with the request
       * ``headers`` _dict_ -  The request headers to send with the request
 
+    For large RPC arguments, ``iter_body()`` can be used instead of ``data``
+    to stream the encoded POST data.
+
     """
 
     def __init__(
@@ -218,7 +223,97 @@ class PreparedBatchExecute(object):
 
         return {"f.req": freq}
 
-    def _validate_rpc(self, rpc: BatchExecuteRpc) -> None:
+    def iter_body(self, chunk_size: int = 65536) -> Iterator[bytes]:
+        """Stream the encoded POST data for a ``batchexecute`` RPC
+
+        Yields the same bytes as URL-encoding ``data`` (i.e. ``f.req=...``),
+        in a single pass: each RPC's ``args`` are serialized incrementally, and each
+        chunk is escaped (as a JSON string) and URL-encoded right away, without building
+        the stringified ``args``, the ``f.req`` value or the full body in memory.
+
+        The generator can be used as a streaming (chunked) request body
+        by most HTTP libraries, e.g. ``requests.post(..., data=pbe.iter_body())``.
+
+        Args:
+            chunk_size (int): The approximate size (in bytes) of the chunks
+                to yield (default: ``65536``)
+
+        Returns:
+            Iterator[bytes]: The chunks of the encoded POST data
+
+        """
+        # 'args' are encoded as in 'data': ASCII only, so that escaping them as a
+        # JSON string (and URL-encoding the result) can be done chunk by chunk
+        encoder = json.JSONEncoder(separators=(",", ":"))
+
+        def _freq() -> Iterator[str]:
+            """Generate the ``f.req`` value, as JSON, with ``args`` escaped in chunks"""
+            yield "[["
+
+            for fct_idx, fct in enumerate(self.rpcs, start=1):
+                if len(self.rpcs) == 1:
+                    fct_idx = 0
+
+                if fct_idx > 1:
+                    yield ","
+
+                yield "[" + encode_basestring_ascii(fct["rpcid"]) + ',"'
+
+                pending = []
+                pending_size = 0
+
+                for piece in encoder.iterencode(fct["args"]):
+                    # Long strings are a single piece, split them
+                    if len(piece) > chunk_size:
+                        if pending:
+                            yield encode_basestring_ascii("".join(pending))[1:-1]
+                            pending = []
+                            pending_size = 0
+
+                        for start in range(0, len(piece), chunk_size):
+                            yield encode_basestring_ascii(
+                                piece[start : start + chunk_size]
+                            )[1:-1]
+
+                        continue
+
+                    pending.append(piece)
+                    pending_size += len(piece)
+
+                    if pending_size >= chunk_size:
+                        yield encode_basestring_ascii("".join(pending))[1:-1]
+                        pending = []
+                        pending_size = 0
+
+                if pending:
+                    yield encode_basestring_ascii("".join(pending))[1:-1]
+
+                yield '",null,'
+                yield encode_basestring_ascii(
+                    str(fct_idx) if fct_idx > 0 else "generic"
+                )
+                yield "]"
+
+            yield "]]"
+
+        chunk = ["f.req="]
+        size = len(chunk[0])
+
+        for piece in _freq():
+            piece = quote_plus(piece, safe="")
+            chunk.append(piece)
+            size += len(piece)
+
+            if size >= chunk_size:
+                yield "".join(chunk).encode("ascii")
+                chunk = []
+                size = 0
+
+        if chunk:
+            yield "".join(chunk).encode("ascii")
+
+    @staticmethod
+    def _validate_rpc(rpc: BatchExecuteRpc) -> None:
         """Validate a RPC format for a ``batchexecute`` RPC
 
         Args:
@@ -0,0 +1,319 @@
+import asyncio
+import collections
+import concurrent.futures
+import math
+import threading
+import time
+from typing import Any, Awaitable, Callable, List, Tuple, Union
+
+from .decode import decode
+from .encode import PreparedBatchExecute
+
+__all__ = ["HedgePolicy", "send_hedged", "send_hedged_async"]
+
+# The 'index' of a hedged duplicate, or a function allocating it
+HedgeIndex = Union[int, Callable[[], int], None]
+
+
+class HedgePolicy(object):
+    """A policy for hedging ``batchexecute`` requests
+
+    When a request has not been answered after a delay (a percentile of
+    recent latencies), a duplicate is sent and the first successful response wins.
+    Hedges are capped to a ``budget`` (a fraction of requests), to bound the extra load.
+
+    **Only use hedging for read-only (idempotent) RPCs**, as they can be executed twice.
+
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        budget: float = 0.05,
+        initial_delay: float = 1.0,
+        min_delay: float = 0.0,
+        window: int = 1000,
+        min_samples: int = 20,
+    ) -> None:
+        """Create a hedging policy
+
+        Args:
+            percentile (float): The percentile of recent latencies after which
+                a request is hedged (default: ``95.0``)
+            budget (float): The maximum fraction of requests that are hedged (default: ``0.05``)
+            initial_delay (float): The delay (in seconds) used until ``min_samples``
+                latencies have been recorded (default: ``1.0``)
+            min_delay (float): The minimum delay (in seconds) (default: ``0.0``)
+            window (int): The number of recent latencies kept (default: ``1000``)
+            min_samples (int): The number of latencies needed before using
+                ``percentile`` (default: ``20``)
+
+        Raises:
+            ValueError: If ``percentile`` is not between ``0`` and ``100``
+            ValueError: If ``budget`` is not between ``0`` and ``1``
+
+        """
+        if not 0 <= percentile <= 100:
+            raise ValueError("'percentile' must be between 0 and 100")
+
+        if not 0 <= budget <= 1:
+            raise ValueError("'budget' must be between 0 and 1")
+
+        self.percentile = percentile
+        self.budget = budget
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+
+        self.requests = 0
+        self.hedges = 0
+
+        self._latencies = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float) -> None:
+        """Record the latency (in seconds) of a request"""
+        with self._lock:
+            self._latencies.append(latency)
+
+    def delay(self) -> float:
+        """Get the delay (in seconds) after which a request is hedged"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return max(self.min_delay, self.initial_delay)
+
+            latencies = sorted(self._latencies)
+
+        # Nearest-rank percentile
+        rank = max(1, math.ceil(self.percentile / 100 * len(latencies)))
+        return max(self.min_delay, latencies[rank - 1])
+
+    def _request(self) -> None:
+        """Count a request (hedged or not)"""
+        with self._lock:
+            self.requests += 1
+
+    def _try_hedge(self) -> bool:
+        """Count a hedge if it is within the budget
+
+        Returns:
+            bool: Whether the request can be hedged
+
+        """
+        with self._lock:
+            if self.hedges + 1 > self.budget * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+
+class _Attempt(object):
+    """A (possibly hedged) attempt at sending a request, for latency tracking"""
+
+    __slots__ = ("started", "recorded")
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.recorded = False
+
+    def finish(self, policy: HedgePolicy) -> None:
+        """Record the latency of the attempt in ``policy`` (once)
+
+        Called when the attempt completes (successfully or not), or when another
+        attempt wins. In the latter case the latency is a lower bound of the actual
+        one (a censored sample), which keeps the slow tail in the percentile.
+
+        """
+        with policy._lock:
+            if self.recorded:
+                return
+            self.recorded = True
+
+        policy.record(time.monotonic() - self.started)
+
+
+def _hedge_of(pbe: PreparedBatchExecute, index: int) -> PreparedBatchExecute:
+    """Prepare the duplicate of ``pbe`` (same RPCs, with ``index``)"""
+    return PreparedBatchExecute(
+        pbe.rpcs,
+        host=pbe.host,
+        app=pbe.app,
+        user=pbe.user,
+        reqid=pbe.reqid,
+        index=index,
+        rt=pbe.rt,
+    )
+
+
+def _hedge_index(pbe: PreparedBatchExecute, hedge_index: HedgeIndex) -> int:
+    """Get the ``index`` of the duplicate of ``pbe``"""
+    if hedge_index is None:
+        return pbe.index + 1
+    elif callable(hedge_index):
+        return hedge_index()
+    return hedge_index
+
+
+def _decode(
+    pbe: PreparedBatchExecute, raw: str, strict: bool
+) -> List[Tuple[int, str, Any]]:
+    """Decode the raw response of ``pbe``"""
+    return decode(
+        raw,
+        rt=pbe.rt,
+        strict=strict,
+        expected_rpcids=[rpc["rpcid"] for rpc in pbe.rpcs],
+    )
+
+
+def send_hedged(
+    pbe: PreparedBatchExecute,
+    send: Callable[[PreparedBatchExecute], str],
+    policy: HedgePolicy,
+    strict: bool = False,
+    hedge_index: HedgeIndex = None,
+) -> List[Tuple[int, str, Any]]:
+    """Send a request, hedged, and decode the first successful response
+
+    ``send`` is called in a thread. If ``pbe`` has not been answered (and decoded)
+    after ``policy.delay()`` and the policy budget allows it, ``send`` is called
+    again with a duplicate of ``pbe`` with another ``index`` (i.e. a new ``_reqid``).
+    Threads can't be cancelled: the slower request is left to finish and its
+    response is ignored.
+
+    Args:
+        pbe (PreparedBatchExecute): The request to send
+        send (callable): A function sending a ``PreparedBatchExecute``
+            and returning the raw response text
+        policy (HedgePolicy): The hedging policy
+        strict (bool): See ``decode()`` (``expected_rpcids`` are the ``rpcid``s of ``pbe``)
+            (default: ``False``)
+        hedge_index (int): The ``index`` of the duplicate, or a function returning it,
+            only called if the request is hedged (default: ``None``, ``pbe.index + 1``).
+            The default collides with the next request of a sequence sharing the
+            same ``reqid``: with a ``RpcScheduler``, pass ``scheduler.reserve_index``
+
+    Returns:
+        list: The decoded response (see ``decode()``)
+
+    Raises:
+        Exception: The exception raised by ``send`` (or ``decode()``)
+            if no request succeeded
+
+    """
+
+    def _attempt(
+        p: PreparedBatchExecute, attempt: _Attempt
+    ) -> List[Tuple[int, str, Any]]:
+        try:
+            return _decode(p, send(p), strict)
+        finally:
+            attempt.finish(policy)
+
+    policy._request()
+
+    attempts = []
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+    try:
+        attempts.append(_Attempt())
+        pending = {executor.submit(_attempt, pbe, attempts[-1])}
+        done, pending = concurrent.futures.wait(pending, timeout=policy.delay())
+
+        if not done and policy._try_hedge():
+            hedge = _hedge_of(pbe, _hedge_index(pbe, hedge_index))
+            attempts.append(_Attempt())
+            pending.add(executor.submit(_attempt, hedge, attempts[-1]))
+
+        error = None
+        while True:
+            # Retrieve every exception first, not to leave any unretrieved
+            errors = [future.exception() for future in done]
+            for future, e in zip(done, errors):
+                if e is None:
+                    return future.result()
+                error = error or e
+
+            if not pending:
+                raise error
+
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+    finally:
+        # Attempts still running lost: record their latency so far
+        for attempt in attempts:
+            attempt.finish(policy)
+        executor.shutdown(wait=False)
+
+
+async def send_hedged_async(
+    pbe: PreparedBatchExecute,
+    send: Callable[[PreparedBatchExecute], Awaitable[str]],
+    policy: HedgePolicy,
+    strict: bool = False,
+    hedge_index: HedgeIndex = None,
+) -> List[Tuple[int, str, Any]]:
+    """Send a request, hedged, and decode the first successful response (``asyncio``)
+
+    Same as ``send_hedged()``, with ``send`` being a coroutine function.
+    The slower request is cancelled.
+
+    Args:
+        pbe (PreparedBatchExecute): The request to send
+        send (callable): A coroutine function sending a ``PreparedBatchExecute``
+            and returning the raw response text
+        policy (HedgePolicy): The hedging policy
+        strict (bool): See ``decode()`` (``expected_rpcids`` are the ``rpcid``s of ``pbe``)
+            (default: ``False``)
+        hedge_index (int): See ``send_hedged()`` (default: ``None``, ``pbe.index + 1``)
+
+    Returns:
+        list: The decoded response (see ``decode()``)
+
+    Raises:
+        Exception: The exception raised by ``send`` (or ``decode()``)
+            if no request succeeded
+
+    """
+
+    async def _attempt(
+        p: PreparedBatchExecute, attempt: _Attempt
+    ) -> List[Tuple[int, str, Any]]:
+        try:
+            return _decode(p, await send(p), strict)
+        finally:
+            attempt.finish(policy)
+
+    policy._request()
+
+    attempts = [_Attempt()]
+    pending = {asyncio.ensure_future(_attempt(pbe, attempts[-1]))}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=policy.delay())
+
+        if not done and policy._try_hedge():
+            hedge = _hedge_of(pbe, _hedge_index(pbe, hedge_index))
+            attempts.append(_Attempt())
+            pending.add(asyncio.ensure_future(_attempt(hedge, attempts[-1])))
+
+        error = None
+        while True:
+            # Retrieve every exception first, not to leave any unretrieved
+            errors = [task.exception() for task in done]
+            for task, e in zip(done, errors):
+                if e is None:
+                    return task.result()
+                error = error or e
+
+            if not pending:
+                raise error
+
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+    finally:
+        # Attempts still running lost: record their latency so far, then cancel them
+        for attempt in attempts:
+            attempt.finish(policy)
+        for task in pending:
+            task.cancel()
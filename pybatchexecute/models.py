@@ -0,0 +1,177 @@
+from collections import namedtuple
+from typing import Any, Callable, Dict, Sequence, Tuple, Union
+
+__all__ = ["ResultModels"]
+
+# A position in a decoded payload: an index, or a path of indexes (or keys)
+Position = Union[int, str, Sequence[Union[int, str]]]
+
+
+def _get(data: Any, path: Tuple[Union[int, str], ...]) -> Any:
+    """Get the value at ``path`` in ``data``, ``None`` if there is none"""
+    try:
+        for key in path:
+            data = data[key]
+        return data
+    except (IndexError, KeyError, TypeError):
+        return None
+
+
+def _compile(cls: Callable, paths: Sequence[Tuple[Union[int, str], ...]]) -> Callable:
+    """Compile an extractor building ``cls`` from the values at ``paths``
+
+    The extractor is generated as straight-line code (e.g. ``v0 = data[0][2][5]``, ...)
+    so that extracting a result costs no more than indexing by hand. Payloads missing
+    any position fall back to a slower path, where missing values are ``None``.
+
+    Args:
+        cls (callable): Called with the extracted values, positionally
+        paths (list): The path of each value
+
+    Returns:
+        callable: The extractor, taking a decoded payload
+
+    """
+    exprs = ["data" + "".join(f"[{key!r}]" for key in path) for path in paths]
+    names = [f"v{i}" for i in range(len(paths))]
+
+    # 'cls' is called outside of the 'try', so that its own errors are raised as-is
+    source = (
+        "def extract(data):\n"
+        + "    try:\n"
+        + "".join(f"        {name} = {expr}\n" for name, expr in zip(names, exprs))
+        + "    except (IndexError, KeyError, TypeError):\n"
+        + f"        {', '.join(names)}, = [_get(data, path) for path in paths]\n"
+        + f"    return cls({', '.join(names)})\n"
+    )
+
+    namespace = {"cls": cls, "paths": paths, "_get": _get}
+    exec(
+        compile(source, f"<extract {getattr(cls, '__name__', cls)}>", "exec"), namespace
+    )
+
+    return namespace["extract"]
+
+
+class ResultModels(object):
+    """A registry of typed result models, per ``rpcid``
+
+    RPC responses are positional nested lists. A model maps named fields to positions
+    in a response (e.g. ``{"title": (0, 2, 5)}`` for ``data[0][2][5]``) and is compiled
+    into an extractor, applied by ``decode()`` as each envelope is decoded (instead of
+    returning the raw decoded list). Unmapped positions are not kept.
+
+    Example:
+
+    ```
+    models = ResultModels()
+    models.register("rpc1id", "Result", {"title": (0, 2, 5), "count": 1})
+
+    decode(raw, models=models)
+    # [(1, 'rpc1id', Result(title='...', count=3))]
+    ```
+
+    """
+
+    def __init__(self) -> None:
+        self._extractors: Dict[str, Callable] = {}
+        self._models: Dict[str, Callable] = {}
+
+    def register(
+        self,
+        rpcid: str,
+        name: str,
+        fields: Dict[str, Position],
+        cls: Callable = None,
+    ) -> Callable:
+        """Register a result model for ``rpcid``
+
+        Args:
+            rpcid (str): The ``rpcid`` of the responses to extract
+            name (str): The name of the model (used for the generated ``namedtuple``)
+            fields (dict): An ordered dictionary of field name to position in a response,
+                either an index (e.g. ``1`` for ``data[1]``) or a path
+                (e.g. ``(0, 2, 5)`` for ``data[0][2][5]``)
+            cls (callable): The class to build, called with the fields positionally
+                in the order of ``fields``, e.g. a ``dataclass(slots=True)``
+                (default: ``None``, a generated ``namedtuple``)
+
+        Returns:
+            callable: The model class
+
+        Raises:
+            ValueError: If ``fields`` is empty or a position is empty
+            ValueError: If a position contains anything other than ``int`` or ``str``
+
+        """
+        if not fields:
+            raise ValueError("'fields' must not be empty")
+
+        paths = []
+        for field, position in fields.items():
+            path = (
+                tuple(position) if isinstance(position, (list, tuple)) else (position,)
+            )
+
+            if not path:
+                raise ValueError(f"Position of field '{field}' must not be empty")
+
+            # Only plain indexes and keys, as they are compiled into the extractor
+            for key in path:
+                if type(key) not in (int, str):
+                    raise ValueError(
+                        f"Position of field '{field}' must only contain int or str, "
+                        + f"got: {key!r}"
+                    )
+
+            paths.append(path)
+
+        if cls is None:
+            cls = namedtuple(name, list(fields))
+
+        self._extractors[rpcid] = _compile(cls, paths)
+        self._models[rpcid] = cls
+
+        return cls
+
+    def unregister(self, rpcid: str) -> None:
+        """Unregister the result model of ``rpcid``
+
+        Args:
+            rpcid (str): The ``rpcid`` of the model
+
+        """
+        self._extractors.pop(rpcid, None)
+        self._models.pop(rpcid, None)
+
+    def __contains__(self, rpcid: str) -> bool:
+        return rpcid in self._extractors
+
+    def model(self, rpcid: str) -> Callable:
+        """Get the model class of ``rpcid``
+
+        Args:
+            rpcid (str): The ``rpcid`` of the model
+
+        Returns:
+            callable: The model class
+
+        Raises:
+            KeyError: If no model is registered for ``rpcid``
+
+        """
+        return self._models[rpcid]
+
+    def extract(self, rpcid: str, data: Any) -> Any:
+        """Extract a decoded response of ``rpcid`` into its model
+
+        Args:
+            rpcid (str): The ``rpcid`` of the response
+            data (list): The decoded JSON data of the response
+
+        Returns:
+            The model instance, or ``data`` as-is if no model is registered for ``rpcid``
+
+        """
+        extractor = self._extractors.get(rpcid)
+        return extractor(data) if extractor is not None else data
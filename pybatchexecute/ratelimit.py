@@ -0,0 +1,442 @@
+import asyncio
+import contextlib
+import threading
+import time
+import weakref
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from .encode import PreparedBatchExecute
+
+__all__ = ["RateLimiter"]
+
+
+class TokenBucket(object):
+    """A token bucket pacing calls to a given rate
+
+    Tokens refill continuously at ``rate`` per second, up to ``burst``.
+    Taking tokens never blocks: the bucket is allowed to go into debt and
+    the time needed to pay it back is returned, so callers can sleep for
+    exactly as long as needed instead of polling.
+
+    The effective rate is ``rate * factor``, where ``factor`` (``]0, 1]``)
+    is lowered by ``throttle()`` and recovers linearly over ``recovery`` seconds.
+
+    """
+
+    __slots__ = (
+        "rate",
+        "burst",
+        "recovery",
+        "min_factor",
+        "factor",
+        "tokens",
+        "updated",
+    )
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float = 1,
+        recovery: float = 30.0,
+        min_factor: float = 0.05,
+    ) -> None:
+        """Create a token bucket
+
+        Args:
+            rate (float): The number of tokens refilled per second
+            burst (float): The maximum number of tokens in the bucket (default: ``1``)
+            recovery (float): The number of seconds for ``factor`` to recover
+                from ``0`` to ``1`` after a throttle (default: ``30.0``)
+            min_factor (float): The lowest ``factor`` a throttle can bring
+                the rate down to (default: ``0.05``)
+
+        Raises:
+            ValueError: If ``rate`` or ``burst`` is not positive
+
+        """
+        if rate <= 0:
+            raise ValueError("'rate' must be positive")
+
+        if burst <= 0:
+            raise ValueError("'burst' must be positive")
+
+        self.rate = rate
+        self.burst = burst
+        self.recovery = recovery
+        self.min_factor = min_factor
+        self.factor = 1.0
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        """Refill tokens (and recover ``factor``) for the time elapsed until ``now``"""
+        elapsed = now - self.updated
+
+        if elapsed <= 0:
+            return
+
+        if self.factor < 1.0:
+            if self.recovery > 0:
+                self.factor = min(1.0, self.factor + elapsed / self.recovery)
+            else:
+                self.factor = 1.0
+
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate * self.factor)
+        self.updated = now
+
+    def take(self, tokens: float = 1, now: float = None) -> float:
+        """Take ``tokens`` from the bucket
+
+        Args:
+            tokens (float): The number of tokens to take (default: ``1``)
+            now (float): The current ``time.monotonic()`` value (default: ``None``, read it)
+
+        Returns:
+            float: The number of seconds to wait before the tokens are
+            actually available (``0.0`` if they are available now)
+
+        """
+        if now is None:
+            now = time.monotonic()
+
+        self._refill(now)
+        self.tokens -= tokens
+
+        if self.tokens >= 0:
+            return 0.0
+
+        return -self.tokens / (self.rate * self.factor)
+
+    def refund(self, tokens: float = 1, now: float = None) -> None:
+        """Give back ``tokens`` taken from the bucket but not used
+
+        Args:
+            tokens (float): The number of tokens to give back (default: ``1``)
+            now (float): The current ``time.monotonic()`` value (default: ``None``, read it)
+
+        """
+        if now is None:
+            now = time.monotonic()
+
+        self._refill(now)
+        self.tokens = min(self.burst, self.tokens + tokens)
+
+    def throttle(self, backoff: float = 0.5, now: float = None) -> None:
+        """Slow the bucket down by multiplying its ``factor`` by ``backoff``
+
+        Args:
+            backoff (float): The multiplier applied to ``factor`` (default: ``0.5``)
+            now (float): The current ``time.monotonic()`` value (default: ``None``, read it)
+
+        """
+        if now is None:
+            now = time.monotonic()
+
+        self._refill(now)
+        self.factor = max(self.min_factor, self.factor * backoff)
+
+        # Drop any accumulated burst so the slowdown is immediate
+        self.tokens = min(self.tokens, 0)
+
+
+class RateLimiter(object):
+    """A rate limiter and concurrency governor for ``batchexecute`` requests
+
+    Limits are tracked per destination, i.e. per ``(host, app, user)``
+    of a ``PreparedBatchExecute``, and (for RPCs) per ``rpcid``:
+
+      * ``requests_per_second``: Requests sent to a destination
+      * ``rpcs_per_second``: RPCs of a given ``rpcid`` sent to a destination
+        (a request with 3 RPCs takes 3 tokens, spread across their ``rpcid``)
+      * ``max_concurrent``: Requests in-flight to a destination
+
+    Any limit left to ``None`` is not enforced.
+
+    Example (sync):
+
+    ```
+    limiter = RateLimiter(requests_per_second=5, max_concurrent=2)
+
+    with limiter.request(pbe):
+        r = requests.post(pbe.url, params=pbe.params, data=pbe.data, headers=pbe.headers)
+
+    if r.status_code == 429:
+        limiter.throttled(pbe)
+    ```
+
+    Example (asyncio):
+
+    ```
+    async with limiter.request_async(pbe):
+        ...
+    ```
+
+    """
+
+    def __init__(
+        self,
+        requests_per_second: float = None,
+        rpcs_per_second: float = None,
+        max_concurrent: int = None,
+        burst: float = 1,
+        backoff: float = 0.5,
+        recovery: float = 30.0,
+    ) -> None:
+        """Create a rate limiter
+
+        Args:
+            requests_per_second (float): The maximum rate of requests per destination
+                (default: ``None``, unlimited)
+            rpcs_per_second (float): The maximum rate of RPCs per destination and ``rpcid``
+                (default: ``None``, unlimited)
+            max_concurrent (int): The maximum number of in-flight requests per destination
+                (default: ``None``, unlimited)
+            burst (float): The number of requests (or RPCs) that can be sent at once
+                before pacing kicks in (default: ``1``)
+            backoff (float): The multiplier applied to the rates of a destination
+                each time it is reported as throttled (default: ``0.5``)
+            recovery (float): The number of seconds for throttled rates
+                to recover back to their full value (default: ``30.0``)
+
+        Raises:
+            ValueError: If any limit (or ``burst``) is not positive
+            ValueError: If ``backoff`` is not between ``0`` (exclusive) and ``1``
+
+        """
+        for name, value in (
+            ("requests_per_second", requests_per_second),
+            ("rpcs_per_second", rpcs_per_second),
+            ("max_concurrent", max_concurrent),
+            ("burst", burst),
+        ):
+            if value is not None and value <= 0:
+                raise ValueError(f"'{name}' must be positive")
+
+        if not 0 < backoff <= 1:
+            raise ValueError("'backoff' must be between 0 (exclusive) and 1")
+
+        self.requests_per_second = requests_per_second
+        self.rpcs_per_second = rpcs_per_second
+        self.max_concurrent = max_concurrent
+        self.burst = burst
+        self.backoff = backoff
+        self.recovery = recovery
+
+        self._lock = threading.Lock()
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        self._semaphores: Dict[Tuple[str, str, str], threading.BoundedSemaphore] = {}
+        # asyncio semaphores are bound to an event loop: keep them per loop
+        self._async_semaphores = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def _destination(pbe: PreparedBatchExecute) -> Tuple[str, str, str]:
+        """Get the destination key of a ``PreparedBatchExecute``"""
+        return (pbe.host, pbe.app, pbe.user)
+
+    def _bucket(self, key: Hashable, rate: float) -> TokenBucket:
+        """Get (or create) the bucket for ``key`` (must be called with the lock held)"""
+        bucket = self._buckets.get(key)
+
+        if bucket is None:
+            bucket = TokenBucket(rate, burst=self.burst, recovery=self.recovery)
+            self._buckets[key] = bucket
+
+        return bucket
+
+    def _costs(self, pbe: PreparedBatchExecute) -> List[Tuple[Hashable, float, int]]:
+        """Get the bucket key, rate and number of tokens needed to send ``pbe``"""
+        dest = self._destination(pbe)
+        costs: List[Tuple[Hashable, float, int]] = []
+
+        if self.requests_per_second is not None:
+            costs.append((dest, self.requests_per_second, 1))
+
+        if self.rpcs_per_second is not None:
+            counts: Dict[str, int] = {}
+            for rpc in pbe.rpcs:
+                counts[rpc["rpcid"]] = counts.get(rpc["rpcid"], 0) + 1
+
+            for rpcid, count in counts.items():
+                costs.append((dest + (rpcid,), self.rpcs_per_second, count))
+
+        return costs
+
+    def reserve(self, pbe: PreparedBatchExecute) -> float:
+        """Reserve the tokens needed to send ``pbe``, without waiting
+
+        The tokens are taken immediately, so the caller is expected to send
+        ``pbe`` after the returned delay (see ``wait()`` and ``wait_async()``),
+        or to give them back with ``refund()`` if it doesn't.
+
+        Args:
+            pbe (PreparedBatchExecute): The request about to be sent
+
+        Returns:
+            float: The number of seconds to wait before sending ``pbe``
+
+        """
+        if self.requests_per_second is None and self.rpcs_per_second is None:
+            return 0.0
+
+        delay = 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            for key, rate, tokens in self._costs(pbe):
+                delay = max(delay, self._bucket(key, rate).take(tokens, now))
+
+        return delay
+
+    def refund(self, pbe: PreparedBatchExecute) -> None:
+        """Give back the tokens reserved for ``pbe``, e.g. if it won't be sent
+
+        Args:
+            pbe (PreparedBatchExecute): The request that was not sent
+
+        """
+        if self.requests_per_second is None and self.rpcs_per_second is None:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            for key, rate, tokens in self._costs(pbe):
+                self._bucket(key, rate).refund(tokens, now)
+
+    def wait(self, pbe: PreparedBatchExecute) -> float:
+        """Block until ``pbe`` can be sent
+
+        Args:
+            pbe (PreparedBatchExecute): The request about to be sent
+
+        Returns:
+            float: The number of seconds waited
+
+        """
+        delay = self.reserve(pbe)
+
+        if delay > 0:
+            time.sleep(delay)
+
+        return delay
+
+    async def wait_async(self, pbe: PreparedBatchExecute) -> float:
+        """Wait (asynchronously) until ``pbe`` can be sent
+
+        If cancelled while waiting, the tokens reserved for ``pbe`` are given back.
+
+        Args:
+            pbe (PreparedBatchExecute): The request about to be sent
+
+        Returns:
+            float: The number of seconds waited
+
+        """
+        delay = self.reserve(pbe)
+
+        if delay > 0:
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.refund(pbe)
+                raise
+
+        return delay
+
+    @contextlib.contextmanager
+    def request(self, pbe: PreparedBatchExecute):
+        """Context manager wrapping the sending of ``pbe``
+
+        Waits for a concurrency slot (if ``max_concurrent`` is set),
+        then for the rate limits, and releases the slot on exit.
+
+        Args:
+            pbe (PreparedBatchExecute): The request about to be sent
+
+        """
+        if self.max_concurrent is None:
+            self.wait(pbe)
+            yield
+            return
+
+        dest = self._destination(pbe)
+
+        with self._lock:
+            semaphore = self._semaphores.get(dest)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.max_concurrent)
+                self._semaphores[dest] = semaphore
+
+        with semaphore:
+            self.wait(pbe)
+            yield
+
+    @contextlib.asynccontextmanager
+    async def request_async(self, pbe: PreparedBatchExecute):
+        """Asynchronous context manager wrapping the sending of ``pbe``
+
+        Same as ``request()``, for use with ``asyncio``. Concurrency slots are
+        separate from the ones of ``request()`` and are per event loop, i.e.
+        ``max_concurrent`` applies to each event loop using the limiter.
+
+        Args:
+            pbe (PreparedBatchExecute): The request about to be sent
+
+        """
+        if self.max_concurrent is None:
+            await self.wait_async(pbe)
+            yield
+            return
+
+        dest = self._destination(pbe)
+
+        loop = asyncio.get_running_loop()
+
+        with self._lock:
+            semaphores = self._async_semaphores.setdefault(loop, {})
+            semaphore = semaphores.get(dest)
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(self.max_concurrent)
+                semaphores[dest] = semaphore
+
+        async with semaphore:
+            await self.wait_async(pbe)
+            yield
+
+    def throttled(self, pbe: PreparedBatchExecute) -> None:
+        """Report that ``pbe`` was throttled upstream (e.g. an HTTP ``429``)
+
+        Multiplies the rates of the destination of ``pbe`` (and of its ``rpcid``s)
+        by ``backoff``. Rates then recover linearly over ``recovery`` seconds.
+
+        Args:
+            pbe (PreparedBatchExecute): The request that was throttled
+
+        """
+        dest = self._destination(pbe)
+        keys: List[Hashable] = [dest] + [dest + (rpc["rpcid"],) for rpc in pbe.rpcs]
+
+        with self._lock:
+            now = time.monotonic()
+            for key in set(keys):
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    bucket.throttle(self.backoff, now)
+
+    def factor(self, pbe: PreparedBatchExecute) -> Optional[float]:
+        """Get the current rate factor of the destination of ``pbe``
+
+        Args:
+            pbe (PreparedBatchExecute): A request to the destination
+
+        Returns:
+            float: The current factor (``]0, 1]``) applied to ``requests_per_second``,
+            or ``None`` if no request was made to the destination yet
+            (or ``requests_per_second`` is not set)
+
+        """
+        with self._lock:
+            bucket = self._buckets.get(self._destination(pbe))
+            if bucket is None:
+                return None
+            bucket._refill(time.monotonic())
+            return bucket.factor
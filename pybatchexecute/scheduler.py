@@ -0,0 +1,311 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .encode import BatchExecuteRpc, PreparedBatchExecute
+
+__all__ = ["RpcScheduler", "PRIORITY_INTERACTIVE", "PRIORITY_BULK"]
+
+# Lower values are sent first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+
+class ScheduledRpc(object):
+    """A RPC waiting in a ``RpcScheduler`` queue
+
+    **Properties**:
+      * ``rpc`` _dict_ - The RPC (``rpcid`` and ``args``)
+      * ``priority`` _int_ - The priority of the RPC (lower is sent first)
+      * ``deadline`` _float_ - The ``time.monotonic()`` value after which
+        the RPC is not sent anymore (``None`` if it has none)
+      * ``submitted`` _float_ - The ``time.monotonic()`` value when the RPC was submitted
+      * ``scheduled`` _float_ - The ``time.monotonic()`` value when the RPC was
+        put in a batch or expired (``None`` while it is queued)
+
+    """
+
+    __slots__ = ("rpc", "priority", "deadline", "submitted", "scheduled", "_seq")
+
+    def __init__(
+        self,
+        rpc: BatchExecuteRpc,
+        priority: int,
+        deadline: Optional[float],
+        submitted: float,
+        seq: int,
+    ) -> None:
+        self.rpc = rpc
+        self.priority = priority
+        self.deadline = deadline
+        self.submitted = submitted
+        self.scheduled = None
+        self._seq = seq
+
+    def __lt__(self, other: "ScheduledRpc") -> bool:
+        # Higher priority first, then first in, first out
+        return (self.priority, self._seq) < (other.priority, other._seq)
+
+    @property
+    def wait(self) -> Optional[float]:
+        """Get the time (in seconds) the RPC spent queued"""
+        if self.scheduled is None:
+            return None
+        return self.scheduled - self.submitted
+
+
+class RpcScheduler(object):
+    """A priority queue of RPCs, batched into ``PreparedBatchExecute``
+
+    RPCs are submitted with a priority (e.g. ``PRIORITY_INTERACTIVE`` or
+    ``PRIORITY_BULK``, lower is sent first) and an optional deadline.
+    Each call to ``next_batch()`` fills a ``PreparedBatchExecute`` with up to
+    ``max_batch_size`` RPCs, highest priority first, so that bulk RPCs only
+    use the capacity left over by interactive ones. RPCs whose deadline has passed
+    are dropped instead of being sent (and passed to ``on_expired``).
+
+    Batches share the same ``reqid`` and have an incremental ``index``
+    (see ``PreparedBatchExecute``). Any other request sharing the ``reqid``
+    (e.g. a hedged duplicate, see ``send_hedged()``) must use an ``index``
+    from ``reserve_index()``, not ``pbe.index + 1`` (the next batch's).
+
+    Example:
+
+    ```
+    scheduler = RpcScheduler(host="example.com", app="example")
+
+    scheduler.submit(rpc1, priority=PRIORITY_INTERACTIVE, deadline=time.monotonic() + 2)
+    scheduler.submit(rpc2, priority=PRIORITY_BULK)
+
+    while (batch := scheduler.next_batch()) is not None:
+        pbe, scheduled = batch
+        ...
+    ```
+
+    """
+
+    def __init__(
+        self,
+        host: str,
+        app: str,
+        user: str = None,
+        reqid: int = None,
+        rt: str = None,
+        max_batch_size: int = 10,
+        on_expired: Callable[[ScheduledRpc], None] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Create a RPC scheduler
+
+        Args:
+            host (str): The host to send the requests to
+            app (str): The app to send the requests to
+            user (str): The user to send the requests to (default: ``None``)
+            reqid (int): The request ID shared by all batches. Must be a four digit number
+                (default: random if ``None``)
+            rt (str): The response type of the requests (default: ``None``)
+            max_batch_size (int): The maximum number of RPCs per batch (default: ``10``)
+            on_expired (callable): Called with each ``ScheduledRpc`` dropped because
+                its deadline has passed (default: ``None``)
+            clock (callable): The clock used for deadlines and metrics
+                (default: ``time.monotonic``)
+
+        Raises:
+            ValueError: If ``max_batch_size`` is not positive
+            ValueError: If ``reqid`` is not a four digit number
+
+        """
+        if max_batch_size <= 0:
+            raise ValueError("'max_batch_size' must be positive")
+
+        if reqid and not 1000 <= reqid <= 9999:
+            raise ValueError("'reqid' must be a four digit positive integer")
+
+        self.host = host
+        self.app = app
+        self.user = user
+        self.reqid = reqid or random.randrange(1000, 9999)
+        self.rt = rt
+        self.max_batch_size = max_batch_size
+        self.on_expired = on_expired
+        self.clock = clock
+
+        self.index = 0
+
+        self._queue: List[ScheduledRpc] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._stats: Dict[int, Dict[str, float]] = {}
+
+    def __len__(self) -> int:
+        """Get the number of queued RPCs"""
+        return len(self._queue)
+
+    def submit(
+        self,
+        rpc: BatchExecuteRpc,
+        priority: int = PRIORITY_BULK,
+        deadline: float = None,
+    ) -> ScheduledRpc:
+        """Queue a RPC
+
+        Args:
+            rpc (dict): A dictionary with 2 keys:
+                * ``rpcid``: The ``rpcid`` of the RPC to execute
+                * ``args``: A list of arguments to pass to the RPC
+            priority (int): The priority of the RPC, lower is sent first
+                (default: ``PRIORITY_BULK``)
+            deadline (float): The ``clock`` value (by default ``time.monotonic()``)
+                after which the RPC is dropped instead of sent (default: ``None``, never)
+
+        Returns:
+            ScheduledRpc: The queued RPC
+
+        Raises:
+            ValueError: If the RPC is of an invalid format
+
+        """
+        PreparedBatchExecute._validate_rpc(rpc)
+
+        item = ScheduledRpc(rpc, priority, deadline, self.clock(), next(self._seq))
+
+        with self._lock:
+            heapq.heappush(self._queue, item)
+
+        return item
+
+    def next_batch(self) -> Optional[Tuple[PreparedBatchExecute, List[ScheduledRpc]]]:
+        """Build the next batch from the queued RPCs
+
+        Returns:
+            tuple: A tuple containing:
+                * ``pbe`` (PreparedBatchExecute): The prepared request
+                * ``scheduled`` (list): The ``ScheduledRpc`` in the batch, in the order
+                  of ``pbe.rpcs`` (i.e. of the response envelopes indexes)
+
+            or ``None`` if no RPC is queued
+
+        Raises:
+            Exception: The first exception raised by ``on_expired`` (after calling it
+                for every expired RPC), in which case the batch is queued back
+
+        """
+        batch: List[ScheduledRpc] = []
+        expired: List[ScheduledRpc] = []
+
+        with self._lock:
+            now = self.clock()
+
+            while self._queue and len(batch) < self.max_batch_size:
+                item = heapq.heappop(self._queue)
+                item.scheduled = now
+
+                if item.deadline is not None and item.deadline < now:
+                    expired.append(item)
+                    self._record(item, "expired")
+                else:
+                    batch.append(item)
+
+            if batch:
+                index = self.index
+                self.index += 1
+
+        pbe = None
+        if batch:
+            pbe = PreparedBatchExecute(
+                [item.rpc for item in batch],
+                host=self.host,
+                app=self.app,
+                user=self.user,
+                reqid=self.reqid,
+                index=index,
+                rt=self.rt,
+            )
+
+        # Callbacks are made outside the lock, they may submit again
+        error = None
+        if self.on_expired is not None:
+            for item in expired:
+                try:
+                    self.on_expired(item)
+                except Exception as e:
+                    error = error or e
+
+        with self._lock:
+            for item in batch:
+                if error is None:
+                    self._record(item, "sent")
+                else:
+                    # Put the batch back, not to lose it to a failing callback
+                    item.scheduled = None
+                    heapq.heappush(self._queue, item)
+
+        if error is not None:
+            raise error
+
+        if pbe is None:
+            return None
+
+        return pbe, batch
+
+    def reserve_index(self) -> int:
+        """Reserve an ``index`` that no batch will use
+
+        For requests sent outside of ``next_batch()`` with the same ``reqid``,
+        e.g. ``send_hedged(pbe, send, policy, hedge_index=scheduler.reserve_index)``.
+
+        Returns:
+            int: The reserved ``index``
+
+        """
+        with self._lock:
+            index = self.index
+            self.index += 1
+
+        return index
+
+    def _record(self, item: ScheduledRpc, outcome: str) -> None:
+        """Record queue metrics for ``item`` (must be called with the lock held)"""
+        stats = self._stats.setdefault(
+            item.priority, {"sent": 0, "expired": 0, "wait_total": 0.0, "wait_max": 0.0}
+        )
+        stats[outcome] += 1
+
+        if outcome == "sent":
+            stats["wait_total"] += item.wait
+            stats["wait_max"] = max(stats["wait_max"], item.wait)
+
+    @property
+    def stats(self) -> Dict[int, Dict[str, float]]:
+        """Get queue metrics, per priority
+
+        Returns:
+            dict: A dictionary of priority to a dictionary with keys:
+                * ``queued`` (int): The number of RPCs currently queued
+                * ``sent`` (int): The number of RPCs put in a batch
+                * ``expired`` (int): The number of RPCs dropped for being past their deadline
+                * ``wait_avg`` (float): The average queue wait (in seconds) of sent RPCs
+                * ``wait_max`` (float): The maximum queue wait (in seconds) of sent RPCs
+
+        """
+        with self._lock:
+            queued: Dict[int, int] = {}
+            for item in self._queue:
+                queued[item.priority] = queued.get(item.priority, 0) + 1
+
+            stats = {}
+            for priority in sorted(set(self._stats) | set(queued)):
+                s = self._stats.get(priority, {})
+                sent = s.get("sent", 0)
+                stats[priority] = {
+                    "queued": queued.get(priority, 0),
+                    "sent": sent,
+                    "expired": s.get("expired", 0),
+                    "wait_avg": s["wait_total"] / sent if sent else 0.0,
+                    "wait_max": s.get("wait_max", 0.0),
+                }
+
+            return stats
@@ -0,0 +1,142 @@
+import os
+import tempfile
+import time
+import unittest
+
+from pybatchexecute.cache import ResponseCache
+from pybatchexecute.decode import decode
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "cache.db")
+        self.rpc = ("uvw", "xyz", "abc", [123, {"b": 1, "a": 2}])
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_invalid_limits(self):
+        with self.assertRaises(ValueError):
+            ResponseCache(self.path, ttl=0)
+        with self.assertRaises(ValueError):
+            ResponseCache(self.path, max_bytes=-1)
+
+    def test_wal_mode(self):
+        with ResponseCache(self.path) as cache:
+            mode = cache._conn.execute("PRAGMA journal_mode").fetchone()[0]
+            self.assertEqual(mode, "wal")
+
+    def test_key_canonical(self):
+        key1 = ResponseCache.key("uvw", "xyz", "abc", [{"a": 1, "b": 2}])
+        key2 = ResponseCache.key("uvw", "xyz", "abc", [{"b": 2, "a": 1}])
+        key3 = ResponseCache.key("uvw", "xyz", "def", [{"a": 1, "b": 2}])
+        self.assertEqual(key1, key2)
+        self.assertNotEqual(key1, key3)
+
+    def test_key_user(self):
+        key1 = ResponseCache.key("uvw", "xyz", "abc", [1])
+        key2 = ResponseCache.key("uvw", "xyz", "abc", [1], user="1")
+        key3 = ResponseCache.key("uvw", "xyz", "abc", [1], user="2")
+        self.assertEqual(len({key1, key2, key3}), 3)
+
+    def test_get_put_user(self):
+        with ResponseCache(self.path) as cache:
+            cache.put(*self.rpc, '["one"]', user="1")
+            self.assertIsNone(cache.get(*self.rpc))
+            self.assertIsNone(cache.get(*self.rpc, user="2"))
+            self.assertEqual(cache.get_data(*self.rpc, user="1"), ["one"])
+
+            cache.delete(*self.rpc, user="1")
+            self.assertIsNone(cache.get(*self.rpc, user="1"))
+
+    def test_get_put(self):
+        with ResponseCache(self.path) as cache:
+            self.assertIsNone(cache.get(*self.rpc))
+
+            cache.put(*self.rpc, '["xyz"]\n')
+            self.assertEqual(cache.get(*self.rpc), '["xyz"]\n')
+            self.assertEqual(cache.get_data(*self.rpc), ["xyz"])
+
+            # Non-string payloads are stored as JSON
+            cache.put(*self.rpc, ["uvw"])
+            self.assertEqual(cache.get(*self.rpc), '["uvw"]')
+
+            cache.delete(*self.rpc)
+            self.assertIsNone(cache.get(*self.rpc))
+
+    def test_ttl(self):
+        with ResponseCache(self.path, ttl=60) as cache:
+            cache.put(*self.rpc, '["xyz"]')
+            self.assertEqual(cache.get(*self.rpc), '["xyz"]')
+
+            with self.assertRaises(ValueError):
+                cache.put(*self.rpc, '["xyz"]', ttl=0)
+            with self.assertRaises(ValueError):
+                cache.put(*self.rpc, '["xyz"]', ttl=-1)
+
+            cache.put(*self.rpc, '["xyz"]', ttl=0.01)
+            time.sleep(0.02)
+            self.assertIsNone(cache.get(*self.rpc))
+
+            self.assertEqual(len(cache), 1)
+            self.assertEqual(cache.compact(), 1)
+            self.assertEqual(len(cache), 0)
+
+    def test_compact_max_bytes(self):
+        with ResponseCache(self.path, max_bytes=10, compact_every=0) as cache:
+            for i in range(5):
+                cache.put("uvw", "xyz", "abc", [i], "12345")
+
+            self.assertEqual(cache.compact(), 3)
+
+            # The newest payloads are kept
+            self.assertIsNone(cache.get("uvw", "xyz", "abc", [2]))
+            self.assertEqual(cache.get("uvw", "xyz", "abc", [3]), "12345")
+            self.assertEqual(cache.get("uvw", "xyz", "abc", [4]), "12345")
+
+    def test_compact_max_bytes_utf8(self):
+        with ResponseCache(self.path, max_bytes=8, compact_every=0) as cache:
+            # 4 characters, 8 bytes
+            cache.put("uvw", "xyz", "abc", [1], "éééé")
+            cache.put("uvw", "xyz", "abc", [2], "éééé")
+
+            self.assertEqual(cache.compact(), 1)
+            self.assertIsNone(cache.get("uvw", "xyz", "abc", [1]))
+            self.assertEqual(cache.get("uvw", "xyz", "abc", [2]), "éééé")
+
+    def test_decode_raw_data(self):
+        raw = r"""
+)]}'
+
+[["wrb.fr","abc","[\"xyz\"]\n",null,null,null,"generic"]]
+"""
+        with ResponseCache(self.path) as cache:
+            for _, rpcid, payload in decode(raw, raw_data=True):
+                cache.put("uvw", "xyz", rpcid, [123], payload)
+
+            self.assertEqual(cache.get("uvw", "xyz", "abc", [123]), '["xyz"]\n')
+            self.assertEqual(cache.get_data("uvw", "xyz", "abc", [123]), ["xyz"])
+
+    def test_compact_every(self):
+        with ResponseCache(self.path, max_bytes=5, compact_every=2) as cache:
+            cache.put("uvw", "xyz", "abc", [1], "12345")
+            cache.put("uvw", "xyz", "abc", [2], "12345")
+            self.assertEqual(len(cache), 1)
+
+    def test_shared(self):
+        cache1 = ResponseCache(self.path)
+        cache2 = ResponseCache(self.path)
+
+        cache1.put(*self.rpc, '["xyz"]')
+        self.assertEqual(cache2.get(*self.rpc), '["xyz"]')
+
+        cache2.clear()
+        self.assertIsNone(cache1.get(*self.rpc))
+
+        cache1.close()
+        cache2.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from unittest import mock
+
+from pybatchexecute import cli
+from pybatchexecute.decode import BatchExecuteDecodeException
+
+RAW_DEFAULT = r"""
+)]}'
+
+[["wrb.fr","abc","[\"xyz\"]\n",null,null,null,"generic"],
+["di",38],
+["e",4,null,null,643]]
+"""
+
+RAW_COMPRESSED = r"""
+)]}'
+
+123
+[["wrb.fr","abc","[\"xyz\"]",null,null,null,"1"]]
+123
+[["wrb.fr","def","[\"uvw\"]",null,null,null,"2"]]
+"""
+
+
+class TestDetectRt(unittest.TestCase):
+    def test_default(self):
+        self.assertIsNone(cli._detect_rt(RAW_DEFAULT))
+
+    def test_compressed(self):
+        self.assertEqual(cli._detect_rt(RAW_COMPRESSED), "c")
+
+    def test_unknown(self):
+        with self.assertRaises(BatchExecuteDecodeException):
+            cli._detect_rt(")]}'\n\nnot a response")
+
+
+class TestDecodeCommand(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.mkdir(os.path.join(self.tmpdir.name, "sub"))
+
+        for name, raw in [
+            ("a.txt", RAW_DEFAULT),
+            (os.path.join("sub", "b.txt"), RAW_COMPRESSED),
+        ]:
+            with open(os.path.join(self.tmpdir.name, name), "w") as f:
+                f.write(raw)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def run_cli(self, *argv, stdin=None):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            with mock.patch("sys.stdin", io.StringIO(stdin or "")):
+                status = cli.main(["decode", *argv])
+
+        records = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        return status, records, stderr.getvalue()
+
+    def test_directory(self):
+        status, records, stderr = self.run_cli(self.tmpdir.name, "-j", "1")
+        self.assertEqual(status, 0)
+        self.assertEqual(
+            records,
+            [
+                {"index": 1, "rpcid": "abc", "data": ["xyz"]},
+                {"index": 1, "rpcid": "abc", "data": ["xyz"]},
+                {"index": 2, "rpcid": "def", "data": ["uvw"]},
+            ],
+        )
+        self.assertIn("Decoded 3 records from 2 responses", stderr)
+
+    def test_parallel(self):
+        _, serial, _ = self.run_cli(self.tmpdir.name, "-j", "1")
+        status, parallel, _ = self.run_cli(self.tmpdir.name, "-j", "2")
+        self.assertEqual(status, 0)
+        self.assertEqual(parallel, serial)
+
+    def test_stdin(self):
+        status, records, _ = self.run_cli("--rt", "c", "-q", stdin=RAW_COMPRESSED)
+        self.assertEqual(status, 0)
+        self.assertEqual(len(records), 2)
+
+    def test_rpcid_filter(self):
+        _, records, _ = self.run_cli(self.tmpdir.name, "-j", "1", "--rpcid", "def")
+        self.assertEqual(records, [{"index": 2, "rpcid": "def", "data": ["uvw"]}])
+
+    def test_strict(self):
+        status, records, stderr = self.run_cli(
+            "--strict", "--expected-rpcid", "abc", "-", stdin=RAW_COMPRESSED
+        )
+        self.assertEqual(status, 1)
+        self.assertEqual(records, [])
+        self.assertIn("Strict: mismatch", stderr)
+
+    def test_strict_without_expected_rpcids(self):
+        status, records, _ = self.run_cli("--strict", "-", stdin=RAW_COMPRESSED)
+        self.assertEqual(status, 0)
+        self.assertEqual(len(records), 2)
+
+        empty = RAW_COMPRESSED.replace(r'"[\"uvw\"]"', '"[]"')
+        status, records, stderr = self.run_cli("--strict", "-", stdin=empty)
+        self.assertEqual(status, 1)
+        self.assertEqual(records, [])
+        self.assertIn("Envelope 2 (def): data is empty (strict).", stderr)
+
+    def test_errors(self):
+        missing = os.path.join(self.tmpdir.name, "missing.txt")
+        a = os.path.join(self.tmpdir.name, "a.txt")
+
+        status, records, stderr = self.run_cli(missing, a, "-j", "1")
+        self.assertEqual(status, 1)
+        self.assertEqual(len(records), 1)
+        self.assertIn("missing.txt", stderr)
+
+        status, records, _ = self.run_cli(missing, a, "-j", "1", "--fail-fast")
+        self.assertEqual(status, 1)
+        self.assertEqual(records, [])
+
+    def test_malformed_envelope(self):
+        bad = os.path.join(self.tmpdir.name, "0_bad.txt")
+        with open(bad, "w") as f:
+            f.write(')]}\'\n\n[["wrb.fr"]]')
+
+        for jobs in ["1", "2"]:
+            status, records, stderr = self.run_cli(self.tmpdir.name, "-j", jobs)
+            self.assertEqual(status, 1)
+            self.assertEqual(len(records), 3)
+            self.assertIn("0_bad.txt: Malformed envelope", stderr)
+
+            status, records, _ = self.run_cli(
+                self.tmpdir.name, "-j", jobs, "--fail-fast"
+            )
+            self.assertEqual(status, 1)
+            self.assertEqual(records, [])
+
+    def test_parallel_bounded(self):
+        for i in range(20):
+            with open(os.path.join(self.tmpdir.name, f"c{i:02}.txt"), "w") as f:
+                f.write(RAW_DEFAULT)
+
+        submitted = []
+        submit = cli.ProcessPoolExecutor.submit
+
+        def _submit(executor, *args):
+            submitted.append(args)
+            return submit(executor, *args)
+
+        # Stop at the 1st file: at most a window of files was submitted
+        with open(os.path.join(self.tmpdir.name, "0_bad.txt"), "w") as f:
+            f.write("not a response")
+
+        with mock.patch.object(cli.ProcessPoolExecutor, "submit", _submit):
+            status, _, _ = self.run_cli(self.tmpdir.name, "-j", "2", "--fail-fast")
+
+        self.assertEqual(status, 1)
+
+        self.assertLessEqual(len(submitted), cli.WINDOW_PER_JOB * 2 + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,4 @@
+import json
 import unittest
 
 from pybatchexecute.decode import (BatchExecuteDecodeException,
@@ -76,6 +77,40 @@ class TestDecodeRtCompressed(unittest.TestCase):
         with self.assertRaises(BatchExecuteDecodeException):
             _decode_rt_compressed(raw, strict=True)
 
+    def test_no_prefix(self):
+        raw = '12\n[["wrb.fr","abc","[1]",null,null,null,"generic"]]\n'
+        self.assertEqual(_decode_rt_compressed(raw), [(1, "abc", [1])])
+
+    def test_trailing_data(self):
+        raw = ")]}'\n\n" + '12\n[["wrb.fr","abc","[1]",null,null,null,"generic"]]\nxyz'
+        with self.assertRaises(BatchExecuteDecodeException):
+            _decode_rt_compressed(raw)
+
+    def test_truncated(self):
+        raw = ")]}'\n\n" + '12\n[["wrb.fr","abc","[1]",null,nu'
+        with self.assertRaises(BatchExecuteDecodeException):
+            _decode_rt_compressed(raw)
+
+    def test_truncated_envelope(self):
+        raw = ")]}'\n\n" + '12\n[["wrb.fr","abc","[1]"]]\n'
+        with self.assertRaisesRegex(BatchExecuteDecodeException, "^Malformed envelope"):
+            _decode_rt_compressed(raw)
+
+    def test_error_messages(self):
+        raw = ")]}'\n\n" + '12\n[["wrb.fr","abc","[x]",null,null,null,"3"]]\n'
+        with self.assertRaisesRegex(
+            BatchExecuteDecodeException,
+            r"^Envelope 3 \(abc\): data is not a valid JSON string\. JSON decode error was: ",
+        ):
+            _decode_rt_compressed(raw)
+
+        raw = ")]}'\n\n" + '12\n[["wrb.fr","abc","[]",null,null,null,"3"]]\n'
+        with self.assertRaisesRegex(
+            BatchExecuteDecodeException,
+            r"^Envelope 3 \(abc\): data is empty \(strict\)\.$",
+        ):
+            _decode_rt_compressed(raw, strict=True)
+
 
 class TestDecodeRtDefault(unittest.TestCase):
     def test_single_rpc(self):
@@ -130,6 +165,54 @@ class TestDecodeRtDefault(unittest.TestCase):
         with self.assertRaises(BatchExecuteDecodeException):
             _decode_rt_default(raw, strict=True)
 
+    def test_no_prefix(self):
+        raw = '[["wrb.fr","abc","[1]",null,null,null,"generic"]]'
+        with self.assertRaisesRegex(json.decoder.JSONDecodeError, "prefix"):
+            _decode_rt_default(raw)
+
+    def test_trailing_data(self):
+        raw = ")]}'\n\n" + '[["wrb.fr","abc","[1]",null,null,null,"generic"]] \n'
+        self.assertEqual(_decode_rt_default(raw), [(1, "abc", [1])])
+
+        raw = (
+            ")]}'\n\n" + '[["wrb.fr","abc","[1]",null,null,null,"generic"]]\n["di",38]'
+        )
+        with self.assertRaisesRegex(json.decoder.JSONDecodeError, "Extra data"):
+            _decode_rt_default(raw)
+
+        raw = ")]}'\n\n" + "[]x"
+        with self.assertRaisesRegex(json.decoder.JSONDecodeError, "Extra data"):
+            _decode_rt_default(raw)
+
+    def test_truncated(self):
+        raw = ")]}'\n\n" + '[["wrb.fr","abc","[1]",null,null,null,"generic"],["di",3'
+        with self.assertRaises(json.decoder.JSONDecodeError):
+            _decode_rt_default(raw)
+
+        raw = ")]}'\n\n" + '[["wrb.fr","abc","[1]",null,null,null,"generic"]'
+        with self.assertRaises(json.decoder.JSONDecodeError):
+            _decode_rt_default(raw)
+
+    def test_truncated_envelope(self):
+        raw = ")]}'\n\n" + '[["wrb.fr","abc","[1]"]]'
+        with self.assertRaisesRegex(BatchExecuteDecodeException, "^Malformed envelope"):
+            _decode_rt_default(raw)
+
+    def test_error_messages(self):
+        raw = ")]}'\n\n" + '[["wrb.fr","abc","[x]",null,null,null,"3"]]'
+        with self.assertRaisesRegex(
+            BatchExecuteDecodeException,
+            r"^Envelope 3 \(abc\): data is not a valid JSON string\. JSON decode error was: ",
+        ):
+            _decode_rt_default(raw)
+
+        raw = ")]}'\n\n" + '[["wrb.fr","abc","[]",null,null,null,"3"]]'
+        with self.assertRaisesRegex(
+            BatchExecuteDecodeException,
+            r"^Envelope 3 \(abc\): data is empty \(strict\)\.$",
+        ):
+            _decode_rt_default(raw, strict=True)
+
 
 class TestDecode(unittest.TestCase):
     def test_valid_rt_compressed(self):
@@ -160,10 +243,33 @@ class TestDecode(unittest.TestCase):
         expected_output = [(1, "abc", ["xyz"])]
         self.assertEqual(decode(raw, rt=None), expected_output)
 
+    def test_raw_data(self):
+        raw = r"""
+)]}'
+
+123
+[["wrb.fr","abc","[\"xyz\"]\n",null,null,null,"1"]]
+123
+[["wrb.fr","def","[]",null,null,null,"2"]]
+"""
+        expected_output = [(1, "abc", '["xyz"]\n'), (2, "def", "[]")]
+        self.assertEqual(decode(raw, rt="c", raw_data=True), expected_output)
+
+        with self.assertRaises(BatchExecuteDecodeException):
+            decode(
+                raw, rt="c", strict=True, expected_rpcids=["abc", "def"], raw_data=True
+            )
+
     def test_invalid_rt(self):
         with self.assertRaises(ValueError):
             decode("test", rt="invalid")
 
+    def test_garbage_rt_compressed(self):
+        with self.assertRaises(BatchExecuteDecodeException):
+            decode("garbage", rt="c")
+        with self.assertRaises(BatchExecuteDecodeException):
+            decode("<html><body>Error 500</body></html>", rt="c")
+
     def test_strict_true_expected_rpcids(self):
         raw = r"""
 )]}'
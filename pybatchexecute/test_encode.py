@@ -1,5 +1,6 @@
 import unittest
 from typing import List
+from urllib.parse import urlencode
 
 from pybatchexecute.encode import BatchExecuteRpc, PreparedBatchExecute
 
@@ -128,6 +129,36 @@ class TestPreparedBatchExecuteExecuteData(unittest.TestCase):
         )
 
 
+class TestPreparedBatchExecuteIterBody(unittest.TestCase):
+    def setUp(self):
+        self.rpc1 = {"rpcid": "abc", "args": [123]}
+        self.rpc2 = {
+            "rpcid": 'd"ef',
+            "args": ['quo"te', "back\\slash\n", "ünï€😀", {"a": [1.5, None, True]}],
+        }
+        self.rpc3 = {"rpcid": "ghi", "args": ["x" * 1000]}
+
+        self.url_params = {"host": "uvw", "app": "xyz"}
+
+    def test_iter_body_single(self):
+        """'iter_body' yields the URL-encoded 'data' (1 RPC)"""
+        pbe = PreparedBatchExecute([self.rpc1], **self.url_params)
+        assert b"".join(pbe.iter_body()) == urlencode(pbe.data).encode()
+
+    def test_iter_body_chunks(self):
+        """'iter_body' yields the URL-encoded 'data' (> 1 RPC, any chunk size)"""
+        pbe = PreparedBatchExecute([self.rpc1, self.rpc2, self.rpc3], **self.url_params)
+        expected = urlencode(pbe.data).encode()
+
+        for chunk_size in [1, 7, 100, 65536]:
+            chunks = list(pbe.iter_body(chunk_size))
+            assert b"".join(chunks) == expected
+
+            # Chunks are bounded (roughly) by 'chunk_size'
+            if chunk_size == 100:
+                assert len(chunks) > 10
+
+
 class TestPreparedBatchExecuteExecuteHeaders(unittest.TestCase):
     def setUp(self):
         self.rpc = {"rpcid": "abc", "args": [123]}
@@ -0,0 +1,204 @@
+import asyncio
+import gc
+import time
+import unittest
+
+from pybatchexecute.encode import PreparedBatchExecute
+from pybatchexecute.hedge import HedgePolicy, send_hedged, send_hedged_async
+from pybatchexecute.scheduler import RpcScheduler
+
+RAW = r"""
+)]}'
+
+[["wrb.fr","abc","[\"xyz\"]\n",null,null,null,"generic"],
+["di",38]]
+"""
+
+
+class TestHedgePolicy(unittest.TestCase):
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            HedgePolicy(percentile=101)
+        with self.assertRaises(ValueError):
+            HedgePolicy(budget=2)
+
+    def test_delay(self):
+        policy = HedgePolicy(percentile=90, initial_delay=5, min_samples=10)
+        self.assertEqual(policy.delay(), 5)
+
+        for latency in range(1, 11):
+            policy.record(latency / 10)
+        self.assertEqual(policy.delay(), 0.9)
+
+    def test_min_delay(self):
+        policy = HedgePolicy(min_delay=1, min_samples=1)
+        policy.record(0.1)
+        self.assertEqual(policy.delay(), 1)
+
+    def test_budget(self):
+        policy = HedgePolicy(budget=0.1)
+        hedged = 0
+        for _ in range(100):
+            policy._request()
+            hedged += policy._try_hedge()
+        self.assertEqual(hedged, 10)
+
+
+class TestSendHedged(unittest.TestCase):
+    def setUp(self):
+        self.pbe = PreparedBatchExecute(
+            [{"rpcid": "abc", "args": [123]}], host="uvw", app="xyz", reqid=1000
+        )
+        self.policy = HedgePolicy(budget=1, initial_delay=0.05)
+        self.sent = []
+
+    def send(self, delays):
+        def _send(pbe):
+            self.sent.append(pbe.params["_reqid"])
+            delay = delays[pbe.index]
+            if isinstance(delay, Exception):
+                raise delay
+            time.sleep(delay)
+            return RAW
+
+        return _send
+
+    def send_async(self, delays):
+        async def _send(pbe):
+            self.sent.append(pbe.params["_reqid"])
+            delay = delays[pbe.index]
+            if isinstance(delay, Exception):
+                raise delay
+            await asyncio.sleep(delay)
+            return RAW
+
+        return _send
+
+    def test_fast(self):
+        decoded = send_hedged(self.pbe, self.send([0]), self.policy)
+        self.assertEqual(decoded, [(1, "abc", ["xyz"])])
+        self.assertEqual(self.sent, [1000])
+        self.assertEqual(self.policy.hedges, 0)
+
+    def test_slow_hedged(self):
+        decoded = send_hedged(self.pbe, self.send([1, 0]), self.policy)
+        self.assertEqual(decoded, [(1, "abc", ["xyz"])])
+        self.assertEqual(self.sent, [1000, 101000])
+        self.assertEqual(self.policy.hedges, 1)
+
+    def test_slow_hedged_latencies(self):
+        send_hedged(self.pbe, self.send([0.3, 0]), self.policy)
+
+        # The loser is recorded (censored) when the hedge wins, and only then
+        self.assertEqual(len(self.policy._latencies), 2)
+        self.assertGreaterEqual(max(self.policy._latencies), 0.05)
+        time.sleep(0.35)
+        self.assertEqual(len(self.policy._latencies), 2)
+
+    def test_hedge_index(self):
+        send_hedged(
+            self.pbe, self.send([0.2, 0, 0, 0, 0, 0]), self.policy, hedge_index=5
+        )
+        self.assertEqual(self.sent, [1000, 501000])
+
+    def test_hedge_index_scheduler(self):
+        scheduler = RpcScheduler(host="uvw", app="xyz", reqid=1000, max_batch_size=1)
+        scheduler.submit({"rpcid": "abc", "args": [1]})
+        scheduler.submit({"rpcid": "abc", "args": [2]})
+
+        pbe, _ = scheduler.next_batch()
+        send_hedged(
+            pbe, self.send([0.2, 0]), self.policy, hedge_index=scheduler.reserve_index
+        )
+        next_pbe, _ = scheduler.next_batch()
+
+        self.assertEqual(self.sent, [1000, 101000])
+        self.assertEqual(next_pbe.index, 2)
+
+    def test_hedge_index_not_hedged(self):
+        scheduler = RpcScheduler(host="uvw", app="xyz", reqid=1000)
+        send_hedged(
+            self.pbe, self.send([0]), self.policy, hedge_index=scheduler.reserve_index
+        )
+        self.assertEqual(scheduler.index, 0)
+
+    def test_hedge_fails(self):
+        decoded = send_hedged(self.pbe, self.send([0.2, OSError()]), self.policy)
+        self.assertEqual(decoded, [(1, "abc", ["xyz"])])
+
+    def test_all_fail(self):
+        with self.assertRaises(OSError):
+            send_hedged(self.pbe, self.send([OSError()]), self.policy)
+        self.assertEqual(len(self.policy._latencies), 1)
+
+    def test_over_budget(self):
+        policy = HedgePolicy(budget=0, initial_delay=0.01)
+        send_hedged(self.pbe, self.send([0.05]), policy)
+        self.assertEqual(self.sent, [1000])
+
+    def test_async_fast(self):
+        decoded = asyncio.run(
+            send_hedged_async(self.pbe, self.send_async([0]), self.policy)
+        )
+        self.assertEqual(decoded, [(1, "abc", ["xyz"])])
+        self.assertEqual(self.sent, [1000])
+
+    def test_async_slow_hedged(self):
+        cancelled = []
+
+        async def _send(pbe):
+            self.sent.append(pbe.params["_reqid"])
+            try:
+                await asyncio.sleep([10, 0][pbe.index])
+            except asyncio.CancelledError:
+                cancelled.append(pbe.index)
+                raise
+            return RAW
+
+        async def main():
+            decoded = await send_hedged_async(self.pbe, _send, self.policy)
+            await asyncio.sleep(0)
+            return decoded
+
+        decoded = asyncio.run(main())
+        self.assertEqual(decoded, [(1, "abc", ["xyz"])])
+        self.assertEqual(self.sent, [1000, 101000])
+        self.assertEqual(cancelled, [0])
+        self.assertEqual(len(self.policy._latencies), 2)
+        self.assertGreaterEqual(max(self.policy._latencies), 0.05)
+
+    def test_async_exceptions_retrieved(self):
+        errors = []
+
+        async def main():
+            loop = asyncio.get_running_loop()
+            loop.set_exception_handler(lambda loop, context: errors.append(context))
+            gate = loop.create_future()
+
+            # Both requests end at once (the 1st failing): both are in 'done'
+            async def _send(pbe):
+                if pbe.index == 1:
+                    loop.call_soon(gate.set_result, None)
+                await gate
+                if pbe.index == 0:
+                    raise OSError()
+                return RAW
+
+            decoded = await send_hedged_async(self.pbe, _send, self.policy)
+            gc.collect()
+            return decoded
+
+        # Whichever of the 2 is picked first
+        for _ in range(10):
+            self.assertEqual(asyncio.run(main()), [(1, "abc", ["xyz"])])
+        self.assertEqual(errors, [])
+
+    def test_async_all_fail(self):
+        with self.assertRaises(OSError):
+            asyncio.run(
+                send_hedged_async(self.pbe, self.send_async([OSError()]), self.policy)
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+from dataclasses import dataclass
+
+from pybatchexecute.decode import decode
+from pybatchexecute.models import ResultModels
+
+
+class TestResultModels(unittest.TestCase):
+    def setUp(self):
+        self.models = ResultModels()
+        self.data = [["a", "b", [0, 1, 2, 3, 4, "title"]], 3, {"key": "value"}]
+
+    def test_register_invalid(self):
+        with self.assertRaises(ValueError):
+            self.models.register("abc", "Result", {})
+        with self.assertRaises(ValueError):
+            self.models.register("abc", "Result", {"title": ()})
+
+    def test_register_invalid_position_type(self):
+        class Evil(int):
+            def __repr__(self):
+                return "0] or __import__('os')['"
+
+        for position in [1.0, (0, None), (0, Evil(1)), True, (0, b"key")]:
+            with self.assertRaises(ValueError):
+                self.models.register("abc", "Result", {"title": position})
+
+    def test_extract_namedtuple(self):
+        Result = self.models.register(
+            "abc", "Result", {"title": (0, 2, 5), "count": 1, "key": (2, "key")}
+        )
+
+        result = self.models.extract("abc", self.data)
+        self.assertIsInstance(result, Result)
+        self.assertEqual(result, Result(title="title", count=3, key="value"))
+        self.assertIs(self.models.model("abc"), Result)
+
+    def test_extract_missing_positions(self):
+        self.models.register("abc", "Result", {"title": (0, 2, 5), "other": (5, 1)})
+
+        result = self.models.extract("abc", [["a", "b", None]])
+        self.assertEqual(tuple(result), (None, None))
+
+    def test_extract_dataclass(self):
+        @dataclass
+        class Result:
+            __slots__ = ("title", "count")
+            title: str
+            count: int
+
+        self.models.register(
+            "abc", "Result", {"title": (0, 2, 5), "count": 1}, cls=Result
+        )
+        self.assertEqual(self.models.extract("abc", self.data), Result("title", 3))
+
+    def test_extract_cls_error(self):
+        calls = []
+
+        def Result(title, count):
+            calls.append((title, count))
+            raise TypeError("from cls")
+
+        self.models.register(
+            "abc", "Result", {"title": (0, 2, 5), "count": 1}, cls=Result
+        )
+
+        # Errors of 'cls' are raised as-is, without a 2nd (slow path) call
+        with self.assertRaisesRegex(TypeError, "from cls"):
+            self.models.extract("abc", self.data)
+        self.assertEqual(calls, [("title", 3)])
+
+    def test_extract_unregistered(self):
+        self.assertNotIn("abc", self.models)
+        self.assertIs(self.models.extract("abc", self.data), self.data)
+
+        self.models.register("abc", "Result", {"count": 1})
+        self.assertIn("abc", self.models)
+        self.models.unregister("abc")
+        self.assertNotIn("abc", self.models)
+
+
+class TestDecodeModels(unittest.TestCase):
+    def test_decode(self):
+        raw = r"""
+)]}'
+
+123
+[["wrb.fr","abc","[[\"xyz\",1]]",null,null,null,"1"]]
+123
+[["wrb.fr","def","[\"uvw\"]",null,null,null,"2"]]
+"""
+        models = ResultModels()
+        Result = models.register("abc", "Result", {"name": (0, 0), "count": (0, 1)})
+
+        self.assertEqual(
+            decode(raw, rt="c", models=models),
+            [(1, "abc", Result(name="xyz", count=1)), (2, "def", ["uvw"])],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
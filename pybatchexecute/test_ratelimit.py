@@ -0,0 +1,190 @@
+import asyncio
+import threading
+import unittest
+
+from pybatchexecute.encode import PreparedBatchExecute
+from pybatchexecute.ratelimit import RateLimiter, TokenBucket
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(0)
+
+    def test_take_paces(self):
+        bucket = TokenBucket(rate=10, burst=1)
+        now = bucket.updated
+
+        # 1st token is available, the next ones are paced at 1/rate
+        self.assertEqual(bucket.take(1, now), 0.0)
+        self.assertAlmostEqual(bucket.take(1, now), 0.1)
+        self.assertAlmostEqual(bucket.take(1, now), 0.2)
+
+    def test_refill_capped_to_burst(self):
+        bucket = TokenBucket(rate=10, burst=2)
+        now = bucket.updated + 60
+
+        self.assertEqual(bucket.take(2, now), 0.0)
+        self.assertAlmostEqual(bucket.take(1, now), 0.1)
+
+    def test_refund(self):
+        bucket = TokenBucket(rate=10, burst=1)
+        now = bucket.updated
+
+        bucket.take(1, now)
+        self.assertAlmostEqual(bucket.take(1, now), 0.1)
+        bucket.refund(1, now)
+        self.assertAlmostEqual(bucket.take(1, now), 0.1)
+
+        # Capped to burst
+        bucket.refund(5, now)
+        self.assertEqual(bucket.tokens, 1)
+
+    def test_throttle_and_recovery(self):
+        bucket = TokenBucket(rate=10, burst=1, recovery=10)
+        now = bucket.updated
+
+        bucket.throttle(0.5, now)
+        self.assertEqual(bucket.factor, 0.5)
+        self.assertAlmostEqual(bucket.take(1, now), 0.2)
+
+        # Linear recovery: +0.1 per second
+        bucket._refill(now + 2)
+        self.assertAlmostEqual(bucket.factor, 0.7)
+        bucket._refill(now + 60)
+        self.assertEqual(bucket.factor, 1.0)
+
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.rpc1 = {"rpcid": "abc", "args": [123]}
+        self.rpc2 = {"rpcid": "def", "args": [123]}
+
+        self.url_params = {"host": "uvw", "app": "xyz"}
+
+    def test_invalid_limits(self):
+        with self.assertRaises(ValueError):
+            RateLimiter(requests_per_second=0)
+        with self.assertRaises(ValueError):
+            RateLimiter(max_concurrent=-1)
+        with self.assertRaises(ValueError):
+            RateLimiter(backoff=2)
+        with self.assertRaises(ValueError):
+            RateLimiter(burst=0)
+
+    def test_unlimited(self):
+        limiter = RateLimiter()
+        pbe = PreparedBatchExecute([self.rpc1], **self.url_params)
+        self.assertEqual(limiter.reserve(pbe), 0.0)
+        self.assertEqual(limiter.reserve(pbe), 0.0)
+
+    def test_requests_per_destination(self):
+        limiter = RateLimiter(requests_per_second=1)
+        pbe1 = PreparedBatchExecute([self.rpc1], **self.url_params)
+        pbe2 = PreparedBatchExecute([self.rpc1], host="other", app="xyz")
+        pbe3 = PreparedBatchExecute([self.rpc1], user="1", **self.url_params)
+
+        self.assertEqual(limiter.reserve(pbe1), 0.0)
+        self.assertGreater(limiter.reserve(pbe1), 0.9)
+
+        # Other destinations have their own budget
+        self.assertEqual(limiter.reserve(pbe2), 0.0)
+        self.assertEqual(limiter.reserve(pbe3), 0.0)
+
+    def test_rpcs_per_rpcid(self):
+        limiter = RateLimiter(rpcs_per_second=1, burst=2)
+        pbe1 = PreparedBatchExecute([self.rpc1, self.rpc1], **self.url_params)
+        pbe2 = PreparedBatchExecute([self.rpc2], **self.url_params)
+
+        # 2 'abc' RPCs use up the burst, 'def' has its own budget
+        self.assertEqual(limiter.reserve(pbe1), 0.0)
+        self.assertEqual(limiter.reserve(pbe2), 0.0)
+        self.assertGreater(limiter.reserve(pbe1), 1.9)
+
+    def test_wait_async_cancelled(self):
+        limiter = RateLimiter(requests_per_second=1, rpcs_per_second=1)
+        pbe = PreparedBatchExecute([self.rpc1], **self.url_params)
+
+        async def main():
+            await limiter.wait_async(pbe)
+
+            # Cancelled while waiting: the request is not sent
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(limiter.wait_async(pbe), 0.05)
+
+        asyncio.run(main())
+
+        # Only the 1st request took tokens
+        self.assertLess(limiter.reserve(pbe), 1.0)
+
+    def test_throttled(self):
+        limiter = RateLimiter(requests_per_second=10, backoff=0.5)
+        pbe = PreparedBatchExecute([self.rpc1], **self.url_params)
+
+        self.assertIsNone(limiter.factor(pbe))
+        limiter.reserve(pbe)
+        self.assertEqual(limiter.factor(pbe), 1.0)
+
+        limiter.throttled(pbe)
+        self.assertLess(limiter.factor(pbe), 0.6)
+
+    def test_request_concurrency(self):
+        limiter = RateLimiter(max_concurrent=1)
+        pbe = PreparedBatchExecute([self.rpc1], **self.url_params)
+
+        with limiter.request(pbe):
+            semaphore = limiter._semaphores[("uvw", "xyz", None)]
+            self.assertFalse(semaphore.acquire(blocking=False))
+
+        self.assertTrue(semaphore.acquire(blocking=False))
+
+    def test_request_async_concurrency(self):
+        limiter = RateLimiter(max_concurrent=2)
+        pbe = PreparedBatchExecute([self.rpc1], **self.url_params)
+        in_flight = []
+
+        async def send():
+            async with limiter.request_async(pbe):
+                in_flight.append(1)
+                self.assertLessEqual(len(in_flight), 2)
+                await asyncio.sleep(0.01)
+                in_flight.pop()
+
+        async def main():
+            await asyncio.gather(*[send() for _ in range(5)])
+
+        asyncio.run(main())
+        self.assertEqual(in_flight, [])
+
+    def test_request_async_many_loops(self):
+        limiter = RateLimiter(max_concurrent=1)
+        pbe = PreparedBatchExecute([self.rpc1], **self.url_params)
+
+        async def send():
+            async with limiter.request_async(pbe):
+                await asyncio.sleep(0)
+
+        async def main():
+            await asyncio.gather(send(), send())
+
+        # Each asyncio.run() uses a new event loop
+        asyncio.run(main())
+        asyncio.run(main())
+
+        # Also from another thread, with its own loop
+        errors = []
+
+        def run():
+            try:
+                asyncio.run(main())
+            except Exception as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        self.assertEqual(errors, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import unittest
+
+from pybatchexecute.scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE, RpcScheduler
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRpcScheduler(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.url_params = {"host": "uvw", "app": "xyz", "reqid": 1000}
+
+    def rpc(self, rpcid):
+        return {"rpcid": rpcid, "args": [123]}
+
+    def test_invalid_rpc(self):
+        scheduler = RpcScheduler(**self.url_params)
+        with self.assertRaises(ValueError):
+            scheduler.submit({"rpcid": "abc"})
+
+    def test_empty(self):
+        scheduler = RpcScheduler(**self.url_params)
+        self.assertIsNone(scheduler.next_batch())
+
+    def test_priority_order(self):
+        scheduler = RpcScheduler(max_batch_size=2, clock=self.clock, **self.url_params)
+
+        scheduler.submit(self.rpc("bulk1"), priority=PRIORITY_BULK)
+        scheduler.submit(self.rpc("bulk2"), priority=PRIORITY_BULK)
+        scheduler.submit(self.rpc("inter1"), priority=PRIORITY_INTERACTIVE)
+        scheduler.submit(self.rpc("inter2"), priority=PRIORITY_INTERACTIVE)
+        scheduler.submit(self.rpc("bulk3"), priority=PRIORITY_BULK)
+
+        rpcids = []
+        while (batch := scheduler.next_batch()) is not None:
+            pbe, scheduled = batch
+            self.assertEqual(pbe.rpcs, [item.rpc for item in scheduled])
+            rpcids.append([rpc["rpcid"] for rpc in pbe.rpcs])
+
+        self.assertEqual(rpcids, [["inter1", "inter2"], ["bulk1", "bulk2"], ["bulk3"]])
+
+    def test_batches_share_reqid(self):
+        scheduler = RpcScheduler(max_batch_size=1, **self.url_params)
+        scheduler.submit(self.rpc("abc"))
+        scheduler.submit(self.rpc("def"))
+
+        pbe1, _ = scheduler.next_batch()
+        pbe2, _ = scheduler.next_batch()
+        self.assertEqual(pbe1.params["_reqid"], 1000)
+        self.assertEqual(pbe2.params["_reqid"], 101000)
+
+    def test_reserve_index(self):
+        scheduler = RpcScheduler(max_batch_size=1, **self.url_params)
+        scheduler.submit(self.rpc("a"))
+        scheduler.submit(self.rpc("b"))
+
+        first, _ = scheduler.next_batch()
+        reserved = scheduler.reserve_index()
+        second, _ = scheduler.next_batch()
+
+        self.assertEqual([first.index, reserved, second.index], [0, 1, 2])
+
+    def test_deadline_expired(self):
+        expired = []
+        scheduler = RpcScheduler(
+            clock=self.clock, on_expired=expired.append, **self.url_params
+        )
+
+        scheduler.submit(self.rpc("late"), deadline=self.clock.now + 1)
+        scheduler.submit(self.rpc("ok"), deadline=self.clock.now + 10)
+        scheduler.submit(self.rpc("none"))
+        self.clock.now += 5
+
+        pbe, _ = scheduler.next_batch()
+        self.assertEqual([rpc["rpcid"] for rpc in pbe.rpcs], ["ok", "none"])
+        self.assertEqual([item.rpc["rpcid"] for item in expired], ["late"])
+
+    def test_deadline_expired_callback_error(self):
+        def on_expired(item):
+            raise RuntimeError(item.rpc["rpcid"])
+
+        scheduler = RpcScheduler(
+            clock=self.clock, on_expired=on_expired, **self.url_params
+        )
+        scheduler.submit(self.rpc("late"), deadline=self.clock.now)
+        scheduler.submit(self.rpc("ok"))
+        self.clock.now += 1
+
+        with self.assertRaisesRegex(RuntimeError, "late"):
+            scheduler.next_batch()
+
+        # The batch was queued back, not lost
+        self.assertEqual(len(scheduler), 1)
+        self.assertEqual(scheduler.stats[PRIORITY_BULK]["sent"], 0)
+
+        pbe, scheduled = scheduler.next_batch()
+        self.assertEqual([rpc["rpcid"] for rpc in pbe.rpcs], ["ok"])
+        self.assertEqual(scheduled[0].wait, 1)
+        self.assertEqual(scheduler.stats[PRIORITY_BULK]["sent"], 1)
+        self.assertEqual(scheduler.stats[PRIORITY_BULK]["expired"], 1)
+
+    def test_only_expired(self):
+        scheduler = RpcScheduler(clock=self.clock, **self.url_params)
+        scheduler.submit(self.rpc("late"), deadline=self.clock.now)
+        self.clock.now += 1
+
+        self.assertIsNone(scheduler.next_batch())
+        self.assertEqual(len(scheduler), 0)
+        self.assertEqual(scheduler.index, 0)
+
+    def test_stats(self):
+        scheduler = RpcScheduler(max_batch_size=1, clock=self.clock, **self.url_params)
+
+        scheduler.submit(self.rpc("abc"), priority=PRIORITY_INTERACTIVE)
+        scheduler.submit(self.rpc("def"), priority=PRIORITY_BULK, deadline=0)
+        scheduler.submit(self.rpc("ghi"), priority=PRIORITY_BULK)
+
+        self.clock.now += 2
+        scheduler.next_batch()
+        self.clock.now += 2
+        scheduler.next_batch()
+
+        stats = scheduler.stats
+        self.assertEqual(
+            stats[PRIORITY_INTERACTIVE],
+            {"queued": 0, "sent": 1, "expired": 0, "wait_avg": 2.0, "wait_max": 2.0},
+        )
+        self.assertEqual(
+            stats[PRIORITY_BULK],
+            {"queued": 0, "sent": 1, "expired": 1, "wait_avg": 4.0, "wait_max": 4.0},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()